@@ -0,0 +1,132 @@
+""" Archive-in / archive-out batches: square zip or tar members in memory, no temp files. """
+import concurrent.futures
+import io
+import os
+import posixpath
+import tarfile
+import time
+import zipfile
+
+from square_core import IMAGE_EXTENSIONS, CPU_COUNT, make_image_square
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+DEFAULT_MAX_IN_FLIGHT_MB = 256 # Compressed input bytes held by queued/running jobs
+
+
+def is_archive(path):
+    return isinstance(path, str) and path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def iter_archive_images(archive_path):
+    """Yields (member name, bytes) for each image in a zip or tar, reading one member at a time."""
+    if archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS): continue
+                yield info.filename, archive.read(info)
+    else:
+        with tarfile.open(archive_path, "r|*") as archive: # Stream mode: sequential, works on compressed tars
+            for member in archive:
+                if not member.isfile() or not member.name.lower().endswith(IMAGE_EXTENSIONS): continue
+                yield member.name, archive.extractfile(member).read()
+
+
+class ArchiveWriter:
+    """Writes (name, bytes) entries into a .zip, a .tar[.gz|.bz2|.xz], or a plain folder."""
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        lower = output_path.lower()
+        self._zip = self._tar = None
+        if lower.endswith('.zip'):
+            # Images are already compressed; deflating them again costs CPU on the writer thread for ~nothing
+            self._zip = zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_STORED)
+        elif is_archive(output_path):
+            compression = {".gz": "gz", ".tgz": "gz", ".bz2": "bz2", ".xz": "xz"}.get(os.path.splitext(lower)[1], "")
+            self._tar = tarfile.open(output_path, f"w:{compression}" if compression else "w")
+        else:
+            os.makedirs(output_path, exist_ok=True)
+
+    def write(self, name, data):
+        if self._zip is not None:
+            self._zip.writestr(name, data)
+        elif self._tar is not None:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+        else:
+            name = posixpath.normpath(name).lstrip("/")
+            if name.startswith(".."): raise ValueError(f"Member escapes the output folder: {name}")
+            path = os.path.join(self.output_path, *name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f: f.write(data)
+
+    def close(self):
+        if self._zip is not None: self._zip.close()
+        if self._tar is not None: self._tar.close()
+
+
+def _square_member_job(name, data, compression_settings, low_memory=False):
+    """Squares one member entirely in memory. Returns (name, output member name or None, output bytes)."""
+    source = io.BytesIO(data)
+    source.name = posixpath.basename(name)
+    output = io.BytesIO()
+    output_name = make_image_square(source, output, compression_settings, low_memory)
+    if not output_name: return name, None, b""
+    return name, posixpath.join(posixpath.dirname(name), output_name), output.getvalue()
+
+
+def square_archive(input_archive, output_path, compression_settings, mode="process", workers=CPU_COUNT,
+                   max_in_flight_mb=DEFAULT_MAX_IN_FLIGHT_MB, low_memory=False, should_stop=None):
+    """Streams images out of input_archive, squares them on a pool and writes them to output_path.
+
+    output_path may be a .zip, a tar, or a folder; member folders are kept. Members are read
+    lazily and only admitted while the compressed bytes in flight stay under max_in_flight_mb
+    (and at most two jobs per worker), so memory stays bounded for any archive size. Results
+    are written as they complete. Yields (member name, output member name or None) per image.
+    """
+    should_stop = should_stop or (lambda: False)
+    workers = max(1, int(workers or 1))
+    budget = max_in_flight_mb * 1024 * 1024
+    writer = ArchiveWriter(output_path)
+    members = iter_archive_images(input_archive)
+    if mode == "serial":
+        try:
+            for name, data in members:
+                if should_stop(): return
+                name, output_name, output_bytes = _square_member_job(name, data, compression_settings, low_memory)
+                if output_name: writer.write(output_name, output_bytes)
+                yield name, output_name
+        finally:
+            members.close()
+            writer.close()
+        return
+
+    # Members are already read ahead here, so "pipeline" is just the process pool
+    executor_cls = concurrent.futures.ProcessPoolExecutor if mode in ("process", "pipeline") else concurrent.futures.ThreadPoolExecutor
+    executor = executor_cls(max_workers=workers)
+    in_flight = {} # future -> input bytes
+    in_flight_bytes = 0
+    next_member = next(members, None)
+    try:
+        while True:
+            while next_member is not None and len(in_flight) < workers * 2:
+                name, data = next_member
+                if in_flight and in_flight_bytes + len(data) > budget: break
+                in_flight[executor.submit(_square_member_job, name, data, compression_settings, low_memory)] = len(data)
+                in_flight_bytes += len(data)
+                next_member = next(members, None)
+            if not in_flight: return
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                in_flight_bytes -= in_flight.pop(future)
+                name, output_name, output_bytes = future.result()
+                if output_name: writer.write(output_name, output_bytes)
+                yield name, output_name
+            if should_stop(): return
+    finally:
+        for future in in_flight: future.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+        members.close()
+        writer.close()
@@ -0,0 +1,134 @@
+""" Atlas mode: square many small textures and pack them into power-of-two sheets plus a JSON index. """
+import collections
+import concurrent.futures
+import json
+import os
+import time
+
+from PIL import Image, UnidentifiedImageError
+
+from square_core import DEFAULT_BG_COLOR_RGB, DEFAULT_BG_COLOR_RGBA, CPU_COUNT, pad_to_square, probe_image, optimize_png, _has_alpha
+
+DEFAULT_ATLAS_SIZE = 2048 # Largest sheet side; sheets shrink to the smallest power of two that fits
+DEFAULT_ATLAS_PADDING = 2 # Transparent pixels between sprites, against filtering bleed
+ATLAS_INDEX_FILENAME = "atlas.json"
+
+
+def _next_power_of_two(value):
+    return 1 << max(0, int(value) - 1).bit_length()
+
+def pack_squares(sides, sheet_size, padding=DEFAULT_ATLAS_PADDING):
+    """Packs squares of the given sides into as few sheet_size sheets as needed.
+
+    Shelf packing, first fit by decreasing size: squares sorted largest first fill
+    shelves of near-equal height, which wastes little space for squares and costs
+    O(n log n + n * shelves), so thousands of sprites pack in milliseconds.
+    Returns (placements, sheet_sides): placements[i] is (sheet, x, y) for sides[i] or
+    None if it cannot fit a sheet; sheet_sides[s] is the power-of-two side that sheet needs.
+    """
+    placements = [None] * len(sides)
+    sheets = [] # Per sheet: list of shelves [y, height, next free x], plus used bottom
+    used = [] # Per sheet: (max x, max y) extents
+    for index in sorted(range(len(sides)), key=lambda i: -sides[i]):
+        side = sides[index] + padding
+        if sides[index] > sheet_size: continue
+        for sheet, shelves in enumerate(sheets):
+            spot = next(((shelf, shelf[2]) for shelf in shelves if shelf[1] >= side and shelf[2] + side <= sheet_size + padding), None)
+            if spot is None:
+                bottom = shelves[-1][0] + shelves[-1][1] if shelves else 0
+                if bottom + side > sheet_size + padding: continue
+                shelves.append([bottom, side, 0])
+                spot = (shelves[-1], 0)
+            break
+        else:
+            sheets.append([[0, side, 0]])
+            used.append((0, 0))
+            sheet, spot = len(sheets) - 1, (sheets[-1][0], 0)
+        shelf, x = spot
+        shelf[2] = x + side
+        placements[index] = (sheet, x, shelf[0])
+        used[sheet] = (max(used[sheet][0], x + sides[index]), max(used[sheet][1], shelf[0] + sides[index]))
+    return placements, [_next_power_of_two(max(extent)) for extent in used]
+
+
+def _load_square(image_path):
+    """Decodes one sprite and pads it to a square (the same squaring as make_image_square), or None if it won't decode.
+
+    Sprites with transparency get transparent padding, opaque ones white, as make_image_square does.
+    """
+    try:
+        with Image.open(image_path) as img:
+            img.load()
+            alpha = _has_alpha(img)
+            converted = img.convert('RGBA' if alpha else 'RGB')
+    except (UnidentifiedImageError, OSError) as e:
+        print(f"Skipping {image_path}: Cannot decode image: {e}")
+        return None
+    return pad_to_square(converted, DEFAULT_BG_COLOR_RGBA if alpha else DEFAULT_BG_COLOR_RGB)
+
+def _index_names(paths):
+    """JSON keys: the file name, or the path where two inputs share a file name."""
+    names = [os.path.basename(path) for path in paths]
+    counts = collections.Counter(names)
+    clashes = {name for name, count in counts.items() if count > 1}
+    return [path.replace(os.sep, "/") if name in clashes else name for path, name in zip(paths, names)]
+
+def build_atlas(input_files, output_folder, max_size=DEFAULT_ATLAS_SIZE, padding=DEFAULT_ATLAS_PADDING,
+                workers=CPU_COUNT, optimize=False, name="atlas"):
+    """Squares input_files and packs them into name_<n>.png sheets plus atlas.json in output_folder.
+
+    Packing only needs sizes, so it runs on image headers; then each sheet is filled by
+    decoding its sprites on a thread pool, one sheet in memory at a time. optimize=True
+    runs the PNG optimizer on each sheet. Returns the index written to atlas.json:
+    {"sheets": [{"file", "size"}], "textures": {name: {"sheet", "x", "y", "size", "source_size"}},
+    "skipped": [paths], "pack_seconds": float}.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    headers = []
+    for image_path in input_files:
+        try:
+            headers.append((image_path, probe_image(image_path)["size"]))
+        except Exception as e:
+            print(f"Error: Cannot read image header: {image_path}: {e}")
+    paths = [path for path, size in headers]
+    sides = [max(size) for path, size in headers]
+
+    start = time.perf_counter()
+    placements, sheet_sides = pack_squares(sides, max_size, padding)
+    pack_seconds = time.perf_counter() - start
+
+    names = _index_names(paths)
+    index = {"sheets": [], "textures": {}, "skipped": [], "pack_seconds": round(pack_seconds, 4)}
+    by_sheet = [[] for _ in sheet_sides]
+    for i, placement in enumerate(placements):
+        if placement is None:
+            print(f"Skipping {paths[i]}: {sides[i]}px is larger than the {max_size}px atlas sheet.")
+            index["skipped"].append(paths[i])
+            continue
+        by_sheet[placement[0]].append(i)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for sheet, members in enumerate(by_sheet):
+            canvas = Image.new('RGBA', (sheet_sides[sheet],) * 2, DEFAULT_BG_COLOR_RGBA)
+            for i, sprite in zip(members, pool.map(lambda i: _load_square(paths[i]), members)):
+                if sprite is None: # Its packed slot stays empty
+                    index["skipped"].append(paths[i])
+                    continue
+                _, x, y = placements[i]
+                canvas.paste(sprite, (x, y))
+                sprite.close()
+                index["textures"][names[i]] = {"sheet": sheet, "x": x, "y": y, "size": sides[i],
+                                               "source_size": list(headers[i][1])}
+            file_name = f"{name}_{sheet}.png"
+            if optimize:
+                data, report = optimize_png(canvas)
+                with open(os.path.join(output_folder, file_name), "wb") as f: f.write(data)
+                print(f"PNG optimizer: {report}")
+            else:
+                canvas.save(os.path.join(output_folder, file_name))
+            canvas.close()
+            index["sheets"].append({"file": file_name, "size": sheet_sides[sheet]})
+
+    with open(os.path.join(output_folder, ATLAS_INDEX_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+    return index
@@ -0,0 +1,321 @@
+""" Reproducible benchmark for the squaring/compression pipeline.
+
+    python square_bench.py                       # run all configs, print JSON
+    python square_bench.py --save-baseline       # ...and store it as the baseline
+    python square_bench.py --compare             # ...and flag regressions against the baseline
+    python square_bench.py --padding             # micro-benchmark: fast padding vs the old paste path
+
+The corpus is synthesized from a seed, so the same seed always produces the same files.
+Each configuration runs in a fresh process so its peak memory is measured in isolation.
+"""
+import argparse
+import concurrent.futures
+import copy
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+from square_core import DEFAULT_COMPRESSION_SETTINGS, DEFAULT_BG_COLOR_RGB, DEFAULT_BG_COLOR_RGBA, CPU_COUNT, square_images, pad_to_square
+
+try:
+    import resource # Unix only; peak RSS is reported as null elsewhere
+except ImportError:
+    resource = None
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench")
+DEFAULT_BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_SEED = 1234
+DEFAULT_CORPUS_SIZE = 60
+DEFAULT_THRESHOLD = 0.10 # 10% worse than baseline counts as a regression
+
+# (mode, format, extension) combinations the corpus cycles through
+CORPUS_KINDS = [
+    ("RGB", "JPEG", ".jpg"),
+    ("RGBA", "PNG", ".png"),
+    ("P", "GIF", ".gif"),
+    ("LA", "PNG", ".png"),
+    ("RGB", "WEBP", ".webp"),
+    ("RGBA", "WEBP", ".webp"),
+    ("P", "PNG", ".png"),
+    ("RGB", "PNG", ".png"),
+]
+CORPUS_SIDES = [128, 256, 512, 1024, 2048]
+CORPUS_ASPECTS = [1.0, 4 / 3, 16 / 9, 2.0, 4.0, 0.5, 0.25]
+
+# name -> compression overrides, executor mode, extra square_images kwargs
+BENCH_CONFIGS = {
+    "plain-serial": {"compression": {}, "mode": "serial"},
+    "plain-process": {"compression": {}, "mode": "process"},
+    "strip_metadata": {"compression": {"strip_metadata": {"enabled": True}}, "mode": "serial"},
+    "optimize": {"compression": {"optimize": {"enabled": True}}, "mode": "serial"},
+    "optimize-process": {"compression": {"optimize": {"enabled": True}}, "mode": "process"},
+    "jpeg_quality": {"compression": {"jpeg_quality": {"enabled": True, "value": 75}}, "mode": "serial"},
+    "quantize": {"compression": {"quantize": {"enabled": True, "colors": 64}}, "mode": "serial"},
+    "quantize_shared": {"compression": {"quantize": {"enabled": True, "colors": 64, "reuse_palette": True}}, "mode": "serial"},
+    "quantize_posterize": {"compression": {"quantize": {"enabled": True, "colors": 64, "method": "posterize"}}, "mode": "serial"},
+    "target_size": {"compression": {"target_size": {"enabled": True, "max_kb": 128}}, "mode": "serial"},
+    "low_memory": {"compression": {}, "mode": "serial", "options": {"low_memory": True}},
+    "plain-thread": {"compression": {}, "mode": "thread"},
+    "plain-pipeline": {"compression": {}, "mode": "pipeline"},
+    "dedup": {"compression": {}, "mode": "serial", "options": {"dedup": "pixels"}},
+    "sizes": {"compression": {"sizes": {"enabled": True, "sizes": [128, 256, 512]}}, "mode": "serial"},
+    "max_size": {"compression": {"max_size": {"enabled": True, "value": 512}}, "mode": "serial"},
+    "trim": {"compression": {"trim": {"enabled": True, "tolerance": 8}}, "mode": "serial"},
+    "auto_format": {"compression": {"auto_format": {"enabled": True}}, "mode": "serial"},
+    # Same as quantize / jpeg_quality plus the gate: the difference between each pair is the gate's cost
+    "quantize-gate": {"compression": {"quantize": {"enabled": True, "colors": 64}, "quality_gate": {"enabled": True}}, "mode": "serial"},
+    "jpeg_quality-gate": {"compression": {"jpeg_quality": {"enabled": True, "value": 75}, "quality_gate": {"enabled": True}}, "mode": "serial"},
+}
+
+
+# --- Corpus ---
+def _synth_image(rng, mode, width, height):
+    """Gradient background plus random shapes: compresses like a real texture, not like noise."""
+    base = Image.linear_gradient("L").resize((width, height)).rotate(rng.choice([0, 90, 180, 270]), expand=False)
+    img = Image.merge("RGB", (base, base.transpose(Image.Transpose.FLIP_LEFT_RIGHT), base.transpose(Image.Transpose.FLIP_TOP_BOTTOM)))
+    img = img.convert("RGBA")
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(5, 25)):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(1, max(2, width // 3)), y0 + rng.randrange(1, max(2, height // 3))
+        fill = tuple(rng.randrange(256) for _ in range(3)) + (rng.choice([0, 128, 255]),)
+        (draw.ellipse if rng.random() < 0.5 else draw.rectangle)((x0, y0, x1, y1), fill=fill)
+    if mode == "RGBA": return img
+    if mode == "RGB": return img.convert("RGB")
+    if mode == "LA": return img.convert("LA")
+    return img.convert("RGB").quantize(rng.choice([16, 64, 256]))
+
+def build_corpus(directory, count=DEFAULT_CORPUS_SIZE, seed=DEFAULT_SEED):
+    """Writes count deterministic textures into directory (reused if already built). Returns their paths."""
+    marker = os.path.join(directory, f".corpus-{seed}-{count}")
+    paths = []
+    rng = random.Random(seed)
+    specs = []
+    for i in range(count):
+        mode, fmt, ext = CORPUS_KINDS[i % len(CORPUS_KINDS)]
+        side = rng.choice(CORPUS_SIDES)
+        aspect = rng.choice(CORPUS_ASPECTS)
+        width, height = (side, max(1, int(side / aspect))) if aspect >= 1 else (max(1, int(side * aspect)), side)
+        specs.append((os.path.join(directory, f"tex_{i:04d}_{mode}_{width}x{height}{ext}"), mode, fmt, width, height))
+    paths = [spec[0] for spec in specs]
+    if os.path.exists(marker): return paths
+
+    os.makedirs(directory, exist_ok=True)
+    for path, mode, fmt, width, height in specs:
+        img = _synth_image(rng, mode, width, height)
+        save_options = {"quality": 90} if fmt in ("JPEG", "WEBP") else {}
+        if fmt == "GIF" and mode == "P": save_options["transparency"] = 0
+        img.save(path, fmt, **save_options)
+    open(marker, "w").close()
+    return paths
+
+
+# --- Running ---
+def _peak_rss_mb():
+    """Peak RSS of this process and its (pool) children, in MB."""
+    if resource is None: return None
+    scale = 1 if sys.platform == "darwin" else 1024 # ru_maxrss is bytes on macOS, KB elsewhere
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak * scale / (1024 * 1024), 1)
+
+def _run_config(name, paths, workers):
+    """Runs one configuration (in its own process) and returns its measurements."""
+    config = BENCH_CONFIGS[name]
+    settings = copy.deepcopy(DEFAULT_COMPRESSION_SETTINGS)
+    for key, value in config["compression"].items():
+        settings[key].update(value)
+    settings["enabled"] = bool(config["compression"])
+
+    out_dir = tempfile.mkdtemp(prefix=f"square_bench_{name}_")
+    try:
+        start = time.perf_counter()
+        results = square_images(paths, out_dir, settings, mode=config["mode"],
+                                workers=workers if config["mode"] != "serial" else 1, **config.get("options", {}))
+        elapsed = time.perf_counter() - start
+        outputs = [path for path in results.values() if path]
+        input_bytes = sum(os.path.getsize(path) for path in paths)
+        output_bytes = sum(os.path.getsize(path) for path in outputs)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return {
+        "files": len(paths),
+        "failed": len(paths) - len(outputs),
+        "seconds": round(elapsed, 4),
+        "files_per_sec": round(len(paths) / elapsed, 2),
+        "mb_per_sec": round(input_bytes / elapsed / (1024 * 1024), 2),
+        "peak_rss_mb": _peak_rss_mb(),
+        "output_ratio": round(output_bytes / input_bytes, 4) if input_bytes else None,
+    }
+
+def run_benchmarks(paths, config_names, workers=CPU_COUNT, repeat=1):
+    """Runs each config repeat times (fresh process each) and keeps the fastest run."""
+    spawn = multiprocessing.get_context("spawn")
+    results = {}
+    for name in config_names:
+        runs = []
+        for _ in range(repeat):
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=spawn) as runner:
+                runs.append(runner.submit(_run_config, name, paths, workers).result())
+        results[name] = max(runs, key=lambda r: r["files_per_sec"])
+        print(f"{name:<18} {results[name]['files_per_sec']:>8.2f} files/s  {results[name]['mb_per_sec']:>7.2f} MB/s  "
+              f"peak {results[name]['peak_rss_mb']} MB  ratio {results[name]['output_ratio']}", file=sys.stderr)
+    return results
+
+
+# --- Padding Micro-Benchmark ---
+PADDING_SIZE = (2048, 1024)
+PADDING_REPEAT = 15
+
+def _padding_sources(width, height):
+    """Source images per mode, as make_image_square sees them after decoding."""
+    base = Image.linear_gradient("L").resize((width, height))
+    opaque = Image.merge("RGBA", (base, base.transpose(Image.Transpose.FLIP_LEFT_RIGHT), base, Image.new("L", (width, height), 255)))
+    translucent = opaque.copy()
+    translucent.putalpha(base)
+    palette = opaque.convert("RGB").quantize(200)
+    palette_transparent = palette.copy()
+    palette_transparent.info["transparency"] = 0
+    palette_unused = palette.copy()
+    palette_unused.info["transparency"] = 255 # Index past the 200 colors in use
+    rgb_square_icc = opaque.convert("RGB").resize((width, width))
+    rgb_square_icc.info["icc_profile"] = b"profile" # Any source metadata must not reach the output
+    rgba_square_icc = opaque.resize((width, width))
+    rgba_square_icc.info["icc_profile"] = b"profile"
+    return {
+        "RGB": opaque.convert("RGB"),
+        "RGBA opaque": opaque,
+        "RGBA opaque square": opaque.resize((width, width)),
+        "RGB square ICC": rgb_square_icc,
+        "RGBA opaque square ICC": rgba_square_icc,
+        "RGBA translucent": translucent,
+        "P": palette,
+        "P transparency": palette_transparent,
+        "P unused transparency": palette_unused,
+        "L": base,
+        "LA": Image.merge("LA", (base, base)),
+    }
+
+def _pad_reference(img):
+    """The padding code as it was: convert, full canvas, paste with the image as its own mask."""
+    mode = 'RGBA' if img.mode in ('RGBA', 'LA') or 'transparency' in img.info else 'RGB'
+    bg_color = DEFAULT_BG_COLOR_RGBA if mode == 'RGBA' else DEFAULT_BG_COLOR_RGB
+    img = img.convert(mode) if img.mode != mode else img.copy()
+    width, height = img.size
+    max_dim = max(width, height)
+    if width == height and (mode == 'RGB' or img.getextrema()[3] == (255, 255)):
+        img.info.clear() # The output of a fresh canvas carries no source metadata
+        return img
+    canvas = Image.new(mode, (max_dim, max_dim), bg_color)
+    canvas.paste(img, ((max_dim - width) // 2, (max_dim - height) // 2), img if mode == 'RGBA' else None)
+    return canvas
+
+def _pad_fast(img):
+    mode = 'RGBA' if img.mode in ('RGBA', 'LA') or 'transparency' in img.info else 'RGB'
+    img = img.convert(mode) if img.mode != mode else img.copy()
+    return pad_to_square(img, DEFAULT_BG_COLOR_RGBA if mode == 'RGBA' else DEFAULT_BG_COLOR_RGB)
+
+def padding_benchmark(size=PADDING_SIZE, repeat=PADDING_REPEAT):
+    """Best-of-repeat milliseconds per source mode for both padding paths, checking identical pixels and info."""
+    results = {}
+    for name, img in _padding_sources(*size).items():
+        timings = {}
+        outputs = {}
+        for label, pad in (("reference", _pad_reference), ("fast", _pad_fast)):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                outputs[label] = pad(img)
+                best = min(best, time.perf_counter() - start)
+            timings[label] = best
+        identical = (outputs["reference"].mode == outputs["fast"].mode and outputs["reference"].info == outputs["fast"].info
+                     and outputs["reference"].tobytes() == outputs["fast"].tobytes())
+        results[name] = {"reference_ms": round(timings["reference"] * 1000, 3), "fast_ms": round(timings["fast"] * 1000, 3),
+                         "speedup": round(timings["reference"] / timings["fast"], 2), "identical": identical}
+        print(f"{name:<20} {results[name]['reference_ms']:>8.2f} ms -> {results[name]['fast_ms']:>8.2f} ms  "
+              f"x{results[name]['speedup']:<5} {'identical' if identical else 'DIFFERENT'}", file=sys.stderr)
+    return results
+
+
+# --- Baseline Comparison ---
+def compare_to_baseline(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Lists regressions: throughput down, or peak memory/output size up, by more than threshold."""
+    regressions = []
+    for name, now in current["configs"].items():
+        before = baseline.get("configs", {}).get(name)
+        if not before: continue
+        checks = [("files_per_sec", -1), ("mb_per_sec", -1), ("peak_rss_mb", 1), ("output_ratio", 1)]
+        for metric, direction in checks:
+            old, new = before.get(metric), now.get(metric)
+            if not old or new is None: continue
+            change = (new - old) / old
+            if change * direction > threshold:
+                regressions.append({"config": name, "metric": metric, "baseline": old, "current": new,
+                                    "change": round(change, 4)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark make_image_square / apply_compression on a synthetic corpus.")
+    parser.add_argument("--corpus", help="Corpus folder (default: a temp folder keyed by seed and count).")
+    parser.add_argument("--count", type=int, default=DEFAULT_CORPUS_SIZE, help="Number of synthetic textures.")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Corpus seed.")
+    parser.add_argument("-j", "--jobs", type=int, default=CPU_COUNT, help="Workers for the parallel configs.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per config; the fastest is kept.")
+    parser.add_argument("--configs", nargs="+", choices=sorted(BENCH_CONFIGS), default=list(BENCH_CONFIGS))
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Baseline JSON path.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline.")
+    parser.add_argument("--compare", action="store_true", help="Compare against the baseline; exit 1 on regressions.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Relative change counted as a regression.")
+    parser.add_argument("--padding", action="store_true", help="Only run the padding micro-benchmark.")
+    args = parser.parse_args(argv)
+
+    if args.padding:
+        results = padding_benchmark()
+        print(json.dumps({"size": PADDING_SIZE, "modes": results}, indent=2))
+        return 0 if all(r["identical"] for r in results.values()) else 1
+
+    corpus_dir = args.corpus or os.path.join(tempfile.gettempdir(), f"square_bench_corpus_{args.seed}_{args.count}")
+    paths = build_corpus(corpus_dir, args.count, args.seed)
+    report = {
+        "corpus": {"seed": args.seed, "count": args.count, "bytes": sum(os.path.getsize(p) for p in paths)},
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": CPU_COUNT,
+                    "workers": args.jobs},
+        "configs": run_benchmarks(paths, args.configs, args.jobs, args.repeat),
+    }
+
+    exit_code = 0
+    if args.compare:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f"Error: No baseline at {args.baseline} (run with --save-baseline first).", file=sys.stderr)
+            return 2
+        if baseline.get("corpus") != report["corpus"]:
+            print("Warning: Baseline was recorded on a different corpus; numbers may not be comparable.", file=sys.stderr)
+        report["regressions"] = compare_to_baseline(report, baseline, args.threshold)
+        for r in report["regressions"]:
+            print(f"REGRESSION {r['config']}: {r['metric']} {r['baseline']} -> {r['current']} ({r['change']:+.1%})", file=sys.stderr)
+        exit_code = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: f.write(text)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f: f.write(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
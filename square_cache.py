@@ -0,0 +1,182 @@
+""" Incremental rebuild cache: a JSON manifest in the output folder recording what produced each output,
+plus an append-only journal of finished files for resuming interrupted runs. """
+import hashlib
+import json
+import os
+
+MANIFEST_FILENAME = ".square_manifest.json"
+MANIFEST_VERSION = 1
+SAVE_EVERY = 200 # Records between periodic manifest flushes
+JOURNAL_FILENAME = ".square_journal.jsonl"
+
+
+def settings_fingerprint(compression_settings):
+    """Stable hash of the settings that affect output bytes."""
+    blob = json.dumps(compression_settings, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+def file_digest(path, chunk_size=1 << 20):
+    """sha256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """Remembers source size/mtime (and optionally a content hash) plus a settings fingerprint per output.
+
+    lookup() returns the existing output path when a source is up to date, so the batch can skip it.
+    force=True ignores everything recorded so far (but still records the new run).
+    """
+
+    def __init__(self, output_folder, use_hash=False, force=False):
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, MANIFEST_FILENAME)
+        self.use_hash = use_hash
+        self.force = force
+        self.entries = {}
+        self._unsaved = 0
+        self.load()
+
+    @staticmethod
+    def _key(image_path):
+        return os.path.normcase(os.path.abspath(image_path))
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("entries", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable manifest {self.path}: {e}")
+            self.entries = {}
+
+    def save(self):
+        if not self._unsaved: return
+        os.makedirs(self.output_folder, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+
+    def lookup(self, image_path, compression_settings):
+        """Returns the recorded output path if image_path's output is current, else None."""
+        if self.force: return None
+        entry = self.entries.get(self._key(image_path))
+        if not entry or entry.get("settings") != settings_fingerprint(compression_settings):
+            return None
+        output_path = os.path.join(self.output_folder, entry["output"])
+        try:
+            src = os.stat(image_path)
+            out = os.stat(output_path)
+        except OSError:
+            return None
+        if out.st_size != entry.get("output_size"):
+            return None
+        if src.st_size == entry.get("size") and src.st_mtime_ns == entry.get("mtime_ns"):
+            return output_path
+        # Stat changed (touched, re-synced, checked out); with hashing on, identical bytes are still current
+        if self.use_hash and src.st_size == entry.get("size") and entry.get("sha256"):
+            if file_digest(image_path) == entry["sha256"]:
+                entry["mtime_ns"] = src.st_mtime_ns
+                self._mark_dirty()
+                return output_path
+        return None
+
+    def record(self, image_path, output_path, compression_settings):
+        """Stores the state of a freshly written output."""
+        try:
+            src = os.stat(image_path)
+            out = os.stat(output_path)
+        except OSError:
+            return
+        self.entries[self._key(image_path)] = {
+            "output": os.path.relpath(output_path, self.output_folder),
+            "output_size": out.st_size,
+            "size": src.st_size,
+            "mtime_ns": src.st_mtime_ns,
+            "sha256": file_digest(image_path) if self.use_hash else None,
+            "settings": settings_fingerprint(compression_settings),
+        }
+        self._mark_dirty()
+
+    def _mark_dirty(self):
+        self._unsaved += 1
+        if self._unsaved >= SAVE_EVERY:
+            self.save()
+
+
+class RunJournal:
+    """Append-only record of the files a run has finished, so an interrupted run can be resumed.
+
+    The first line names the settings fingerprint; each later line is one finished
+    {"source", "output"} pair, flushed and fsynced as it is written so a crash, kill or
+    power loss loses at most the file being written. resume=True keeps an existing journal
+    (if its settings match) and done() then reports what it already finished; otherwise
+    a new journal is started.
+    """
+
+    def __init__(self, output_folder, compression_settings, resume=False):
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, JOURNAL_FILENAME)
+        self.settings = settings_fingerprint(compression_settings)
+        self.entries = {}
+        if resume: self.load()
+        os.makedirs(output_folder, exist_ok=True)
+        # Rewrite (atomically) what is kept, which also drops a torn last line, then append to it
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"settings": self.settings}) + "\n")
+            for source, output in self.entries.items():
+                f.write(json.dumps({"source": source, "output": output}, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"Warning: Not resuming, unreadable journal {self.path}: {e}")
+            return
+        entries = {}
+        for index, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break # Torn last line from a crash mid-write
+            if index == 0:
+                if record.get("settings") != self.settings:
+                    print("Warning: Not resuming, the last run used different compression settings.")
+                    return
+            elif "source" in record:
+                entries[record["source"]] = record["output"]
+        self.entries = entries
+
+    def done(self, image_path):
+        """Returns the output path if image_path finished in the journaled run (and its output is still there)."""
+        output = self.entries.get(BuildManifest._key(image_path))
+        if output is None: return None
+        output_path = os.path.join(self.output_folder, output)
+        return output_path if os.path.exists(output_path) else None
+
+    def record(self, image_path, output_path):
+        key = BuildManifest._key(image_path)
+        self.entries[key] = os.path.relpath(output_path, self.output_folder)
+        self._append({"source": key, "output": self.entries[key]})
+
+    def _append(self, record):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed: self._file.close()
@@ -0,0 +1,286 @@
+""" Headless command line front-end. Usage: python -m image_square INPUT... -o OUTPUT_DIR [options] """
+import argparse
+import copy
+import glob
+import itertools
+import os
+import sys
+import time
+
+from square_core import DEFAULT_COMPRESSION_SETTINGS, EXECUTOR_MODES, RESAMPLE_FILTERS, AUTO_FORMATS, QUALITY_GATE_METRICS, QUANTIZE_METHODS, IMAGE_EXTENSIONS, DEDUP_LEVELS, CPU_COUNT, run_batch, plan_batch, summarize_plan
+from square_cache import BuildManifest, RunJournal
+from square_report import RunReport, SLOWEST_N, summary_path
+from square_watch import FolderWatcher, DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_TIME
+from square_atlas import DEFAULT_ATLAS_SIZE, DEFAULT_ATLAS_PADDING, ATLAS_INDEX_FILENAME, build_atlas
+from square_archive import DEFAULT_MAX_IN_FLIGHT_MB, is_archive, square_archive
+from square_scan import scan_images
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="image_square",
+        description="Pad textures to a 1:1 square for Tower Unite without cropping or distorting them. "
+                    "Run with no arguments to open the GUI."
+    )
+    parser.add_argument("inputs", nargs="+", help="Input files, folders or glob patterns (e.g. 'textures/**/*.png').")
+    parser.add_argument("-o", "--output", required=True,
+                        help="Output folder (created if missing), or a .zip/.tar[.gz] when the input is an archive.")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="Scan input folders recursively and mirror their subfolders in the output. "
+                             "Files start processing while the scan is still running.")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="Only take folder files whose name or relative path matches GLOB (repeatable).")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="Leave out folder files and subfolders whose name or relative path matches GLOB (repeatable).")
+    parser.add_argument("-j", "--jobs", type=int, default=CPU_COUNT, help=f"Number of workers (default: {CPU_COUNT}).")
+    parser.add_argument("--engine", choices=EXECUTOR_MODES, default="process", help="Batch executor (default: process).")
+    parser.add_argument("--force", action="store_true", help="Rebuild every file, ignoring the output folder's manifest.")
+    parser.add_argument("--link", action="store_true", help="Hard-link already-square files instead of copying them.")
+    parser.add_argument("--plan", action="store_true", help="Only print what would be padded, converted, copied or skipped.")
+    parser.add_argument("--dedup", choices=DEDUP_LEVELS,
+                        help="Process identical inputs once: by file bytes, or by decoded pixels (catches re-encodes).")
+    parser.add_argument("--low-memory", action="store_true", help="Pad and encode PNG outputs in bands instead of a full square canvas.")
+    parser.add_argument("--memory-budget", type=int, default=0, metavar="MB",
+                        help="Only run as many jobs at once as fit this estimated memory budget (default: no cap).")
+    parser.add_argument("--report", metavar="FILE.jsonl",
+                        help="Time each stage per file; write JSONL records here and percentiles to FILE.summary.json.")
+    parser.add_argument("--slowest", type=int, default=SLOWEST_N, help=f"Slowest files to list with --report (default: {SLOWEST_N}).")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and square images as they appear in the input folder(s). Stop with Ctrl+C.")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL_INTERVAL, help="Watch mode: seconds between folder scans.")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_TIME,
+                        help="Watch mode: seconds a file must stay unchanged before it is processed.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run: files its journal lists as finished are not redone.")
+    parser.add_argument("--atlas", action="store_true",
+                        help=f"Pack the squared inputs into power-of-two sheets (atlas_<n>.png) with an {ATLAS_INDEX_FILENAME} index.")
+    parser.add_argument("--atlas-size", type=int, default=DEFAULT_ATLAS_SIZE, metavar="PX",
+                        help=f"Largest atlas sheet side, rounded to a power of two (default: {DEFAULT_ATLAS_SIZE}).")
+    parser.add_argument("--atlas-padding", type=int, default=DEFAULT_ATLAS_PADDING, metavar="PX",
+                        help=f"Transparent gap between atlas sprites (default: {DEFAULT_ATLAS_PADDING}).")
+    parser.add_argument("--hash", action="store_true", help="Also compare content hashes, so touched-but-identical sources are skipped.")
+    parser.add_argument("--in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT_MB, metavar="MB",
+                        help=f"Archive input: cap on compressed member bytes held by queued jobs (default: {DEFAULT_MAX_IN_FLIGHT_MB}).")
+
+    compression = parser.add_argument_group("compression", "Any of these turns compression on.")
+    compression.add_argument("--strip-metadata", action="store_true", help="Strip metadata (EXIF, etc.).")
+    compression.add_argument("--optimize", action="store_true",
+                             help="Pass optimize=True to the encoder; PNG outputs also search filters/zlib strategies for the smallest file.")
+    compression.add_argument("--jpeg-quality", type=int, metavar="1-100", help="JPEG quality for JPEG outputs.")
+    compression.add_argument("--target-kb", type=int, metavar="KB",
+                             help="Pick the highest JPEG quality (up to --jpeg-quality, else 95) that fits under KB.")
+    compression.add_argument("--quantize", type=int, metavar="COLORS", help="Reduce to at most this many colors (2-256); PNG outputs become 8-bit paletted.")
+    compression.add_argument("--quantize-method", choices=QUANTIZE_METHODS, default="palette",
+                             help="palette: true palette quantization (default); posterize: the older bit-depth approximation.")
+    compression.add_argument("--shared-palette", action="store_true", help="With --quantize, map the whole batch onto one palette.")
+    compression.add_argument("--sizes", type=int, nargs="+", metavar="PX",
+                             help="Also write NAME_square_<PX> downscales (e.g. --sizes 512 1024 2048) from the same decode.")
+    compression.add_argument("--auto-format", nargs="?", const=",".join(AUTO_FORMATS), metavar="FORMATS",
+                             help=f"Write whichever of FORMATS (comma-separated, default {','.join(AUTO_FORMATS)}) is smallest.")
+    compression.add_argument("--min-psnr", type=float, metavar="DB",
+                             help=f"Lowest PSNR accepted by --auto-format (default: {DEFAULT_COMPRESSION_SETTINGS['auto_format']['min_psnr']}) "
+                                  f"and --quality-gate psnr (default: {DEFAULT_COMPRESSION_SETTINGS['quality_gate']['min_psnr']}).")
+    compression.add_argument("--min-quality", type=int, default=DEFAULT_COMPRESSION_SETTINGS["auto_format"]["min_quality"], metavar="1-95",
+                             help="--auto-format: lowest JPEG/WebP quality to try (default: %(default)s).")
+    compression.add_argument("--quality-gate", nargs="?", const="ssim", choices=QUALITY_GATE_METRICS,
+                             help="Score quantized/JPEG outputs on the unpadded area (default metric: ssim) and back off "
+                                  "colors/quality until they pass.")
+    compression.add_argument("--min-ssim", type=float, default=DEFAULT_COMPRESSION_SETTINGS["quality_gate"]["min_ssim"], metavar="0-1",
+                             help="--quality-gate ssim: lowest SSIM accepted (default: %(default)s).")
+    compression.add_argument("--trim", action="store_true",
+                             help="Crop transparent (or uniform-color) borders before squaring, so the square fits the content.")
+    compression.add_argument("--trim-margin", type=int, default=DEFAULT_COMPRESSION_SETTINGS["trim"]["margin"], metavar="PX",
+                             help="--trim: keep up to PX of the border around the content (default: %(default)s).")
+    compression.add_argument("--trim-tolerance", type=int, default=DEFAULT_COMPRESSION_SETTINGS["trim"]["tolerance"], metavar="0-255",
+                             help="--trim: alpha (or color difference) at or below this counts as border (default: %(default)s).")
+    compression.add_argument("--max-size", type=int, metavar="PX",
+                             help="Shrink large images so the square is at most PX; JPEGs are decoded at reduced scale.")
+    compression.add_argument("--resample", choices=list(RESAMPLE_FILTERS), default="lanczos",
+                             help="Filter for --sizes and --max-size (default: lanczos).")
+    return parser
+
+
+def _power_of_two_floor(value):
+    return 1 << (max(1, value).bit_length() - 1)
+
+
+def iter_inputs(patterns, recursive=False, include=(), exclude=(), skip=()):
+    """Yields (image file, output subfolder) for globs, files and folders, de-duplicated and lazily.
+
+    Folders are streamed through scan_images, so files come out while the tree is still being
+    walked; with recursive=True their subfolders are kept as output subfolders. skip lists
+    folders never to scan (the output folder).
+    """
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = scan_images(pattern, recursive, include, exclude, skip=skip)
+        else:
+            matches = ((path, "") for path in sorted(glob.glob(pattern, recursive=True)) or [pattern])
+        for path, subfolder in matches:
+            if os.path.isdir(path): continue
+            # Explicitly named files are kept as-is; anything matched by a glob/folder must look like an image
+            if path != pattern and not path.lower().endswith(IMAGE_EXTENSIONS): continue
+            if path not in seen:
+                seen.add(path)
+                yield path, subfolder
+
+def settings_from_args(args):
+    """Builds a compression settings dict (same shape as the GUI's) from parsed arguments."""
+    settings = copy.deepcopy(DEFAULT_COMPRESSION_SETTINGS)
+    if args.strip_metadata: settings["strip_metadata"]["enabled"] = True
+    if args.optimize: settings["optimize"]["enabled"] = True
+    if args.jpeg_quality is not None:
+        settings["jpeg_quality"].update(enabled=True, value=max(1, min(100, args.jpeg_quality)))
+    if args.target_kb is not None:
+        settings["target_size"].update(enabled=True, max_kb=max(1, args.target_kb))
+    if args.quantize is not None:
+        settings["quantize"].update(enabled=True, colors=max(2, min(256, args.quantize)),
+                                    method=args.quantize_method, reuse_palette=args.shared_palette)
+    if args.sizes:
+        settings["sizes"].update(enabled=True, sizes=sorted(set(args.sizes)), resample=args.resample)
+    if args.auto_format:
+        formats = [fmt.strip().lower() for fmt in args.auto_format.split(",")]
+        unknown = [fmt for fmt in formats if fmt not in AUTO_FORMATS]
+        if unknown: print(f"Warning: Ignoring unknown --auto-format format(s): {', '.join(unknown)}", file=sys.stderr)
+        settings["auto_format"].update(enabled=True, formats=formats, min_quality=args.min_quality)
+        if args.min_psnr is not None: settings["auto_format"]["min_psnr"] = args.min_psnr
+    if args.quality_gate:
+        settings["quality_gate"].update(enabled=True, metric=args.quality_gate, min_ssim=args.min_ssim)
+        if args.min_psnr is not None: settings["quality_gate"]["min_psnr"] = args.min_psnr
+    if args.trim:
+        settings["trim"].update(enabled=True, margin=max(0, args.trim_margin), tolerance=max(0, min(254, args.trim_tolerance)))
+    if args.max_size:
+        settings["max_size"].update(enabled=True, value=max(1, args.max_size), resample=args.resample)
+    settings["enabled"] = any(v.get("enabled") for k, v in settings.items() if isinstance(v, dict))
+    return settings
+
+
+def watch(args, settings):
+    """--watch: runs a warm FolderWatcher on the first input folder until Ctrl+C."""
+    folders = [path for path in args.inputs if os.path.isdir(path)]
+    if not folders:
+        print("Error: --watch needs at least one input folder.", file=sys.stderr)
+        return 2
+    manifest = BuildManifest(args.output, use_hash=args.hash, force=args.force)
+    job_options = {"link": args.link, "low_memory": args.low_memory}
+
+    def on_result(image_path, output_path, info):
+        if info.get("skipped"): return
+        if output_path: print(f"{time.strftime('%H:%M:%S')} {image_path} -> {output_path}")
+        else: print(f"{time.strftime('%H:%M:%S')} Failed conversion: {image_path}", file=sys.stderr)
+
+    watcher = FolderWatcher(folders[0], args.output, settings, mode=args.engine, workers=args.jobs, manifest=manifest,
+                            job_options=job_options, poll_interval=args.poll, settle_time=args.settle, on_result=on_result)
+    if len(folders) > 1:
+        print(f"Warning: Watching only the first folder ({folders[0]}).", file=sys.stderr)
+    print(f"Watching {folders[0]} -> {args.output} (Ctrl+C to stop)")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    return 0
+
+
+def convert_archive(args, settings):
+    """Archive input: streams members through the pool straight into the output archive/folder."""
+    if len(args.inputs) > 1:
+        print("Error: An archive input must be the only input.", file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    success_count = 0; error_count = 0
+    for member, output_member in square_archive(args.inputs[0], args.output, settings, mode=args.engine, workers=args.jobs,
+                                                max_in_flight_mb=args.in_flight, low_memory=args.low_memory):
+        if output_member:
+            success_count += 1
+            print(f"[{success_count + error_count}] {member} -> {output_member}")
+        else:
+            error_count += 1
+            print(f"[{success_count + error_count}] Failed conversion: {member}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(f"Completed. {success_count} succeeded, {error_count} failed in {elapsed:.2f}s -> {args.output}")
+    return 1 if error_count else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if any(is_archive(path) and os.path.isfile(path) for path in args.inputs):
+        return convert_archive(args, settings_from_args(args))
+    if args.watch:
+        os.makedirs(args.output, exist_ok=True)
+        return watch(args, settings_from_args(args))
+    inputs = iter_inputs(args.inputs, args.recursive, args.include, args.exclude, skip=[args.output])
+    first = next(inputs, None)
+    if first is None:
+        print("Error: No input images found.", file=sys.stderr)
+        return 2
+    os.makedirs(args.output, exist_ok=True)
+    settings = settings_from_args(args)
+    # Recursive scans feed the workers as files are found, unless an option needs the whole list first
+    streaming = args.recursive and not (args.plan or args.atlas or args.dedup or args.shared_palette)
+    if streaming:
+        input_files = itertools.chain([first], inputs)
+    else:
+        input_files = [first] + list(inputs)
+    if args.atlas:
+        index = build_atlas([path for path, subfolder in input_files], args.output, max_size=_power_of_two_floor(args.atlas_size),
+                            padding=max(0, args.atlas_padding), workers=args.jobs, optimize=args.optimize)
+        sheets = ", ".join(f"{sheet['file']} ({sheet['size']}px)" for sheet in index["sheets"])
+        print(f"Atlas: {len(index['textures'])} textures in {len(index['sheets'])} sheets: {sheets}. "
+              f"Packed in {index['pack_seconds']:.3f}s; index: {os.path.join(args.output, ATLAS_INDEX_FILENAME)}")
+        return 1 if index["skipped"] else 0
+
+    manifest = BuildManifest(args.output, use_hash=args.hash, force=args.force)
+
+    start = time.perf_counter()
+    plan = None
+    if not streaming:
+        plan = plan_batch([path for path, subfolder in input_files], settings, manifest)
+        counts = summarize_plan(plan)
+        print("Plan: " + ", ".join(f"{count} to {action}" for action, count in counts.items()))
+        if args.plan:
+            for file_path, entry in plan.items():
+                detail = entry.get("reason") or "x".join(map(str, entry["size"]))
+                print(f"  {entry['action']:<8} {file_path} ({detail})")
+            return 0
+
+    report = RunReport(args.report, args.slowest) if args.report else None
+    journal = RunJournal(args.output, settings, resume=args.resume)
+    if journal.entries: print(f"Resuming: {len(journal.entries)} files already finished by the interrupted run.")
+    total_files = "?" if streaming else len(input_files) # Unknown until the scan ends
+    success_count = 0; error_count = 0; skipped_count = 0; processed = 0
+    dedup_count = 0; dedup_bytes = 0
+    for file_path, output_path, info in run_batch(input_files, args.output, settings, mode=args.engine, workers=args.jobs,
+                                                  manifest=manifest, plan=plan, link_identical=args.link,
+                                                  low_memory=args.low_memory, memory_budget_mb=args.memory_budget,
+                                                  instrument=report is not None, dedup=args.dedup,
+                                                  journal=journal, lazy_plan=streaming):
+        processed += 1
+        if report is not None: report.add(file_path, output_path, info)
+        if not output_path:
+            error_count += 1
+            print(f"[{processed}/{total_files}] Failed conversion: {file_path}", file=sys.stderr)
+        elif info.get("skipped"):
+            skipped_count += 1
+        else:
+            success_count += 1
+            if info.get("action") == "dedup":
+                dedup_count += 1
+                dedup_bytes += os.path.getsize(file_path)
+            score = f" ({info['quality']['metric']} {info['quality']['score']})" if info.get("quality") else ""
+            print(f"[{processed}/{total_files}] {file_path} -> {output_path}{score}")
+    elapsed = time.perf_counter() - start
+    print(f"Completed. {success_count} succeeded, {error_count} failed, {skipped_count} up to date in {elapsed:.2f}s.")
+    if dedup_count:
+        print(f"Dedup: {dedup_count} duplicate file{'s' if dedup_count != 1 else ''} reused an existing result "
+              f"({dedup_bytes / (1024 * 1024):.1f} MB of input not reprocessed).")
+    if report is not None:
+        summary = report.close()
+        for stage, stats in summary["stages"].items():
+            print(f"  {stage:<8} sum {stats['sum']:.3f}s  p50 {stats['p50']:.4f}s  p90 {stats['p90']:.4f}s  p99 {stats['p99']:.4f}s")
+        for metric, stats in summary["quality_gate"].items():
+            print(f"  {metric:<8} min {stats['min']}  mean {stats['mean']}  below minimum: {stats['below_min']}/{stats['count']}")
+        for entry in summary["slowest"]:
+            print(f"  slow: {entry['seconds']:.3f}s  {entry['file']}")
+        print(f"Run report: {report.path} (summary: {summary_path(report.path)})")
+    return 1 if error_count else 0
@@ -0,0 +1,1631 @@
+""" Core squaring/compression engine. No GUI or audio imports, safe for headless use. """
+from PIL import Image, UnidentifiedImageError, ImageOps, ImageChops, ImageStat, GifImagePlugin, features
+import os
+import io
+import copy
+import shutil
+import struct
+import zlib
+import time
+import hashlib
+import importlib.util
+import math
+import contextlib
+import collections
+import concurrent.futures # For the thread/process pool batch engine
+
+from square_cache import BuildManifest, RunJournal, file_digest
+
+# --- NumPy (optional: low-memory PNG filtering, shared-palette mapping, quality gate) ---
+# Only looked up here; each helper imports it when first used, so importing this module stays fast
+numpy_available = importlib.util.find_spec("numpy") is not None
+
+# --- Constants ---
+DEFAULT_BG_COLOR_RGB = (255, 255, 255) # White
+DEFAULT_BG_COLOR_RGBA = (255, 255, 255, 0) # Transparent White
+
+# Default compression settings
+DEFAULT_COMPRESSION_SETTINGS = {
+    "enabled": False,
+    "strip_metadata": {"enabled": False},
+    "optimize": {"enabled": False},
+    "jpeg_quality": {"enabled": False, "value": 85},
+    "quantize": {"enabled": False, "colors": 256, "method": "palette", "reuse_palette": False},
+    "target_size": {"enabled": False, "max_kb": 1024}, # Highest JPEG quality that fits under max_kb
+    "sizes": {"enabled": False, "sizes": [512, 1024, 2048], "resample": "lanczos"}, # Extra _square_<size> outputs
+    "max_size": {"enabled": False, "value": 2048, "resample": "lanczos"}, # Shrink so the square is at most value px
+    # Write whichever of formats is smallest; lossy encodes must keep min_psnr dB at min_quality or above
+    "auto_format": {"enabled": False, "formats": ["png", "jpeg", "webp"], "min_quality": 75, "min_psnr": 40.0},
+    # Score lossy outputs (quantize, JPEG) on the unpadded content; back off until the metric meets its minimum
+    "quality_gate": {"enabled": False, "metric": "ssim", "min_ssim": 0.95, "min_psnr": 38.0},
+    # Crop transparent (or uniform-color) borders before squaring; keep up to margin px of them
+    "trim": {"enabled": False, "margin": 0, "tolerance": 0}
+}
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.webp')
+
+# Batch engine settings
+EXECUTOR_MODES = ("process", "thread", "serial", "pipeline")
+EXECUTOR_MODE_LABELS = {"process": "Process Pool", "thread": "Thread Pool", "serial": "Serial",
+                        "pipeline": "Pipelined (slow drives)"}
+CPU_COUNT = os.cpu_count() or 1
+DEFAULT_BATCH_SETTINGS = {
+    "mode": "process",
+    "workers": CPU_COUNT,
+    "incremental": True, # Skip files whose output is already current (see square_cache)
+    "link_identical": False, # Hard-link (instead of copy) already-square files that need no re-encode
+    "low_memory": False, # Band-wise paste/encode instead of a full square canvas (PNG outputs)
+    "memory_budget_mb": 0, # Admit parallel jobs by estimated footprint; 0 = no cap
+    "instrument": False, # Time each stage per file and write a run report (see square_report)
+    "dedup": None, # "bytes" or "pixels": process identical inputs once (see find_duplicates)
+    "resume": False # Continue an interrupted run from its journal (see square_cache.RunJournal)
+}
+LOW_MEMORY_BUDGET_MB = 1024 # Budget the GUI uses when low-memory mode is switched on
+PNG_BAND_ROWS = 256 # Rows per band in the low-memory PNG writer
+TARGET_SIZE_MIN_QUALITY = 5 # Lowest JPEG quality the target-size search will go to
+TARGET_SIZE_MAX_QUALITY = 95 # Upper bound when the JPEG quality option is off
+RESAMPLE_FILTERS = {
+    "nearest": Image.Resampling.NEAREST, "box": Image.Resampling.BOX, "bilinear": Image.Resampling.BILINEAR,
+    "hamming": Image.Resampling.HAMMING, "bicubic": Image.Resampling.BICUBIC, "lanczos": Image.Resampling.LANCZOS,
+}
+MAX_SIZE_REDUCING_GAP = 3.0 # Box-reduce by whole factors until within 3x of the target, then run the filter
+PIPELINE_IO_THREADS = 4 # Reader/writer threads in pipeline mode
+PIPELINE_PREFETCH = 8 # Files read ahead of the CPU stage, on top of two per worker
+PIPELINE_WRITE_BACKLOG = 8 # Encoded outputs waiting to be written before the CPU stage pauses
+OPACITY_SAMPLE = 32 # Side of the pixel sample pad_to_square checks before scanning the whole alpha band
+PARTIAL_SUFFIX = ".part" # Outputs are written here first and renamed into place when complete
+
+
+# --- Core Image Processing Functions ---
+QUANTIZE_METHODS = ("palette", "posterize")
+PALETTE_SAMPLE_FILES = 16 # Images sampled to build a shared batch palette
+PALETTE_SAMPLE_THUMB = 128 # Thumbnail size for those samples
+PALETTE_LUT_BITS = 5 # Bits per RGBA channel in the NumPy palette lookup table (32^4 entries)
+
+def apply_compression(img, settings):
+    """Applies color reduction to the padded canvas, right before saving.
+
+    quantize with method "palette" (the default) returns a true P-mode image with at most
+    `colors` entries and alpha kept in the palette; method "posterize" is the older
+    bits-per-channel approximation (alpha now preserved). A batch "palette" in the
+    settings (see build_batch_palette) maps every image onto that one palette instead.
+    """
+    quantize = settings.get("quantize", {})
+    if quantize.get("enabled"):
+        num_colors = max(2, min(256, quantize.get("colors", 256)))
+        try:
+            if quantize.get("method", "palette") == "posterize":
+                img = _posterize(img, num_colors)
+            elif quantize.get("palette"):
+                img = map_to_palette(img, quantize["palette"])
+                print(f"Mapped to shared batch palette ({len(quantize['palette']) // 4} colors)")
+            else:
+                img = quantize_image(img, num_colors)
+                print(f"Quantized to a {num_colors}-color palette")
+        except Exception as e:
+            print(f"Error during quantization: {e}")
+    return img
+
+def _posterize(img, num_colors):
+    """Old approximation: keep ~cbrt(num_colors) levels per channel. Alpha is left untouched."""
+    bits_per_channel = max(1, int(num_colors**(1/3)).bit_length())
+    if bits_per_channel > 8: bits_per_channel = 8
+    alpha = img.getchannel('A') if _has_alpha(img) else None
+    img = ImageOps.posterize(img.convert('RGB'), bits_per_channel)
+    if alpha is not None:
+        img.putalpha(alpha)
+    print(f"Applied posterization to ~{num_colors} colors (using {bits_per_channel} bits)")
+    return img
+
+def _quantize_method():
+    """libimagequant gives the best palettes when Pillow was built with it; fast octree otherwise."""
+    if features.check_feature("libimagequant"): return Image.Quantize.LIBIMAGEQUANT
+    return Image.Quantize.FASTOCTREE
+
+def quantize_image(img, num_colors):
+    """True palette quantization to <= num_colors colors (no dithering, so flat areas stay flat).
+
+    RGBA input yields a P image with an RGBA palette, which PNG saves with a tRNS chunk.
+    """
+    if img.mode not in ('RGB', 'RGBA'): img = img.convert('RGBA' if _has_alpha(img) else 'RGB')
+    return img.quantize(num_colors, method=_quantize_method())
+
+def build_batch_palette(image_paths, num_colors, sample_files=PALETTE_SAMPLE_FILES):
+    """Builds one RGBA palette (flat list, 4 ints per color) from thumbnails of up to sample_files images.
+
+    The padding colors are included so padded borders map exactly.
+    """
+    thumbs = []
+    for image_path in list(image_paths)[:sample_files]:
+        try:
+            with Image.open(image_path) as img:
+                img.draft('RGB', (PALETTE_SAMPLE_THUMB, PALETTE_SAMPLE_THUMB))
+                thumb = img.convert('RGBA')
+            thumb.thumbnail((PALETTE_SAMPLE_THUMB, PALETTE_SAMPLE_THUMB))
+            thumbs.append(thumb)
+        except Exception as e:
+            print(f"Warning: Skipping {image_path} for the batch palette: {e}")
+    mosaic = Image.new('RGBA', (PALETTE_SAMPLE_THUMB * (len(thumbs) + 1), PALETTE_SAMPLE_THUMB), DEFAULT_BG_COLOR_RGBA)
+    mosaic.paste(Image.new('RGBA', (PALETTE_SAMPLE_THUMB // 2, PALETTE_SAMPLE_THUMB), DEFAULT_BG_COLOR_RGB + (255,)), (0, 0))
+    for i, thumb in enumerate(thumbs, start=1):
+        mosaic.paste(thumb, (i * PALETTE_SAMPLE_THUMB, 0))
+    quantized = quantize_image(mosaic, num_colors)
+    used = len(quantized.getcolors(256))
+    return quantized.getpalette('RGBA')[:used * 4]
+
+# LUTs built from a palette, cached per process: palette tuple -> uint8 array of 32^4 palette indexes
+_palette_luts = {}
+
+def _palette_lut(palette):
+    """Nearest-palette-index lookup table over a 5-bit-per-channel RGBA grid, built with NumPy matmuls."""
+    key = tuple(palette)
+    if key not in _palette_luts:
+        import numpy as np
+        colors = np.array(palette, dtype=np.float32).reshape(-1, 4)
+        levels = np.arange(1 << PALETTE_LUT_BITS, dtype=np.float32) * 255 / ((1 << PALETTE_LUT_BITS) - 1)
+        grid = np.stack(np.meshgrid(levels, levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 4)
+        color_norms = (colors ** 2).sum(axis=1)
+        lut = np.empty(len(grid), dtype=np.uint8)
+        for i in range(0, len(grid), 1 << 16):
+            # argmin ||g - c||² == argmin (||c||² - 2 g·c); ||g||² is the same for every c
+            distances = color_norms[None, :] - 2 * (grid[i:i + (1 << 16)] @ colors.T)
+            lut[i:i + (1 << 16)] = distances.argmin(axis=1)
+        _palette_luts[key] = lut
+    return _palette_luts[key]
+
+def map_to_palette(img, palette):
+    """Maps img onto a fixed RGBA palette (flat list). Vectorized LUT lookup with NumPy;
+    without NumPy, opaque images use Pillow's palette quantizer and others get their own palette."""
+    num_colors = len(palette) // 4
+    if numpy_available:
+        shift = 8 - PALETTE_LUT_BITS
+        import numpy as np
+        rgba = np.asarray(img.convert('RGBA')) >> shift
+        idx = ((rgba[..., 0].astype(np.uint32) << (3 * PALETTE_LUT_BITS)) | (rgba[..., 1].astype(np.uint32) << (2 * PALETTE_LUT_BITS))
+               | (rgba[..., 2].astype(np.uint32) << PALETTE_LUT_BITS) | rgba[..., 3])
+        out = Image.fromarray(_palette_lut(palette)[idx], 'P')
+        out.putpalette(palette, 'RGBA')
+        return out
+    if not _has_alpha(img) and all(a == 255 for a in palette[3::4]):
+        ref = Image.new('P', (1, 1))
+        ref.putpalette([v for i, v in enumerate(palette) if i % 4 != 3])
+        return img.convert('RGB').quantize(palette=ref, dither=Image.Dither.NONE)
+    return quantize_image(img, num_colors)
+
+def _has_alpha(img):
+    """True when the squared output needs an alpha channel (RGBA canvas, PNG output)."""
+    return img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+
+def _output_path(image_path, output_folder, mode):
+    """Output file path for image_path once squared into a canvas of the given mode."""
+    base_name = os.path.basename(image_path)
+    name, ext = os.path.splitext(base_name)
+    output_ext = '.png' if mode == 'RGBA' else ext.lower()
+    if output_ext not in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']:
+         output_ext = '.png'
+    return os.path.join(output_folder, f"{name}_square{output_ext}")
+
+def pad_to_square(img, bg_color):
+    """Centers an RGB/RGBA image on a square bg_color canvas; closes img unless it is returned.
+
+    Pixel-identical to pasting img with itself as the mask, minus the work that cannot change
+    the result: with an all-255 alpha the masked blend equals a plain copy, so no mask is
+    used, and an already-square opaque image is returned as-is with no canvas at all.
+    Only the alpha band is scanned for that check (about 4x cheaper than getextrema()), and a
+    nearest-neighbour sample rejects most translucent images before the full scan. A returned
+    img has its info cleared, so no ICC profile or tRNS key gets through that a canvas would drop.
+    """
+    width, height = img.size
+    max_dim = max(width, height)
+    opaque = img.mode == 'RGB' or (
+        img.resize((OPACITY_SAMPLE, OPACITY_SAMPLE), Image.Resampling.NEAREST).getchannel('A').getextrema()[0] == 255
+        and img.getchannel('A').getextrema() == (255, 255))
+    if opaque and width == height:
+        img.info.clear()
+        return img
+    canvas = Image.new(img.mode, (max_dim, max_dim), bg_color)
+    canvas.paste(img, ((max_dim - width) // 2, (max_dim - height) // 2), None if opaque else img)
+    img.close() # Source no longer needed once it is on the canvas
+    return canvas
+
+def _replace_image(old, new):
+    """Closes old once a step has produced a new image from it, so intermediates don't pile up."""
+    if new is not old: old.close()
+    return new
+
+def _lap(timings, stage, start):
+    """Adds the time since start to timings[stage] (when timing is on) and returns the new start."""
+    now = time.perf_counter()
+    if timings is not None: timings[stage] = timings.get(stage, 0.0) + (now - start)
+    return now
+
+def _open_output(output):
+    """Context manager giving a writable binary file for a path, or the caller's stream (left open)."""
+    if hasattr(output, "write"): return contextlib.nullcontext(output)
+    return open(output, "wb")
+
+def _commit_output(partial_path, output_path):
+    """Moves a finished partial file into place; the rename is atomic, so output_path is never half-written."""
+    if partial_path is not None: os.replace(partial_path, output_path)
+
+def make_image_square(image_path, output_folder, compression_settings, low_memory=False, timings=None, quality_report=None):
+    """Converts an image to a 1:1 aspect ratio by padding, applying compression.
+
+    image_path and output_folder may be a path or a binary file object. low_memory=True pads and encodes
+    PNGs in bands; timings and quality_report, if dicts, receive per-stage seconds and the quality gate score.
+    Returns the output path (a file name when writing to a stream), or None on failure.
+    """
+    source_name = image_path if isinstance(image_path, (str, os.PathLike)) else getattr(image_path, "name", "image.png")
+    to_stream = hasattr(output_folder, "write")
+    partial_path = None
+    try:
+        start = time.perf_counter()
+        img = Image.open(image_path)
+        original_format = img.format
+        max_size = 0
+        trim = compression_settings.get("enabled", False) and compression_settings.get("trim", {}).get("enabled")
+        if compression_settings.get("enabled", False) and compression_settings.get("max_size", {}).get("enabled"):
+            max_size = max(1, int(compression_settings["max_size"].get("value", 2048)))
+            # The draft is sized from the whole image; with trim, the content may already fit the cap
+            if not trim: draft_for_max_size(img, max_size)
+        img.load()
+        start = _lap(timings, "decode", start)
+        quantize = compression_settings.get("enabled", False) and compression_settings.get("quantize", {}).get("enabled")
+
+        if _has_alpha(img):
+            mode = 'RGBA'
+            bg_color = DEFAULT_BG_COLOR_RGBA
+        else:
+            mode = 'RGB'
+            bg_color = DEFAULT_BG_COLOR_RGB
+
+        if trim and not is_animated(img):
+            if img.mode != mode: img = _replace_image(img, img.convert(mode))
+            start = _lap(timings, "convert", start)
+            img = trim_to_content(img, compression_settings["trim"].get("margin", 0), compression_settings["trim"].get("tolerance", 0))
+            start = _lap(timings, "trim", start)
+
+        if max_size and max(img.size) > max_size and not is_animated(img):
+            if img.mode in ('P', '1'): img = _replace_image(img, img.convert(mode)) # Pillow resizes these with NEAREST only
+            img = shrink_to_max_size(img, max_size, compression_settings["max_size"].get("resample", "lanczos"))
+            start = _lap(timings, "resize", start)
+
+        width, height = img.size
+        max_dim = max(width, height)
+
+        output_path = _output_path(source_name, "" if to_stream else output_folder, mode)
+        animated = is_animated(img)
+        if animated: output_path = os.path.splitext(output_path)[0] + ANIMATED_FORMATS[img.format]
+        output_ext = os.path.splitext(output_path)[1]
+        partial_path = None if to_stream else output_path + PARTIAL_SUFFIX
+        output = output_folder if to_stream else partial_path
+        paste_x = (max_dim - width) // 2
+        paste_y = (max_dim - height) // 2
+
+        if animated:
+            if compression_settings.get("enabled", False): print("Animated image: compression options are not applied.")
+            square_animation(img, output, output_ext, mode, bg_color, max_dim, (paste_x, paste_y))
+            img.close()
+            _commit_output(partial_path, output_path)
+            _lap(timings, "encode", start) # Frames are converted and padded as they are encoded
+            return output_path
+
+        sizes = compression_settings.get("enabled", False) and compression_settings.get("sizes", {}).get("enabled")
+        auto_format = compression_settings.get("enabled", False) and compression_settings.get("auto_format", {}).get("enabled")
+        if low_memory and output_ext == '.png' and not (quantize or sizes or auto_format): # These need the whole canvas
+            optimize = compression_settings.get("enabled", False) and compression_settings.get("optimize", {}).get("enabled")
+            _write_png_banded(img, output, mode, bg_color, max_dim, (paste_x, paste_y), 9 if optimize else 6)
+            img.close()
+            _commit_output(partial_path, output_path)
+            _lap(timings, "encode", start) # Convert/paste happen inside the band loop
+            return output_path
+
+        if img.mode != mode: img = _replace_image(img, img.convert(mode))
+        start = _lap(timings, "convert", start)
+
+        new_img = pad_to_square(img, bg_color)
+        start = _lap(timings, "paste", start)
+
+        levels = []
+        if sizes:
+            if to_stream: print("Skipping extra sizes: Output is a stream.")
+            else:
+                levels = cascade_sizes(new_img, compression_settings["sizes"].get("sizes", ()),
+                                       compression_settings["sizes"].get("resample", "lanczos"))
+                start = _lap(timings, "resize", start)
+
+        is_jpeg_output = output_ext in ['.jpg', '.jpeg']
+        save_options = {}
+        target = None # (max_bytes, max_quality) for the target-size search
+
+        if compression_settings.get("enabled", False):
+            # Strip metadata: Pillow usually does this unless told otherwise??? Explicit is complex.
+            if compression_settings.get("strip_metadata", {}).get("enabled"):
+                 print("Stripping metadata (Pillow default behavior)")
+
+            if compression_settings.get("optimize", {}).get("enabled"):
+                save_options['optimize'] = True
+                print("Applying save optimization")
+
+            if is_jpeg_output and compression_settings.get("target_size", {}).get("enabled"):
+                max_bytes = int(compression_settings["target_size"].get("max_kb", 1024) * 1024)
+                if compression_settings.get("jpeg_quality", {}).get("enabled"):
+                    max_quality = compression_settings["jpeg_quality"].get("value", 85)
+                else:
+                    max_quality = TARGET_SIZE_MAX_QUALITY
+                target = (max_bytes, max_quality)
+            elif not is_jpeg_output and compression_settings.get("target_size", {}).get("enabled"):
+                 print("Skipping target size: Output is not JPEG.")
+
+            if auto_format and target:
+                print("Skipping target size: Auto format picks the output format.")
+                target = None
+
+            if is_jpeg_output and compression_settings.get("jpeg_quality", {}).get("enabled") and not target:
+                quality = compression_settings.get("jpeg_quality", {}).get("value", 85)
+                save_options['quality'] = quality
+                print(f"Applying JPEG quality: {quality}")
+            elif not is_jpeg_output and compression_settings.get("jpeg_quality", {}).get("enabled"):
+                 print("Skipping JPEG quality: Output is not JPEG.")
+
+        choice = None
+        if auto_format:
+            choice, start = _write_auto_canvas(new_img, output, compression_settings, quantize, save_options.get('optimize', False),
+                                               None, timings, start)
+            output_path = os.path.splitext(output_path)[0] + AUTO_FORMAT_EXTENSIONS[choice[0]]
+        else:
+            start = _write_canvas(new_img, output, output_ext, compression_settings, quantize, save_options, target, timings, start,
+                                  gate_box=(paste_x, paste_y, paste_x + width, paste_y + height), quality_report=quality_report)
+        _commit_output(partial_path, output_path)
+        for size, level in levels:
+            level_path = _level_path(output_path, size)
+            partial_path = level_path + PARTIAL_SUFFIX
+            if choice:
+                _, start = _write_auto_canvas(level, partial_path, compression_settings, quantize, save_options.get('optimize', False),
+                                              choice, timings, start)
+            else:
+                level_box = tuple(round(v * size / max_dim) for v in (paste_x, paste_y, paste_x + width, paste_y + height))
+                start = _write_canvas(level, partial_path, output_ext, compression_settings, quantize, save_options, target, timings, start,
+                                      gate_box=level_box)
+            _commit_output(partial_path, level_path)
+        return output_path
+
+    except UnidentifiedImageError: print(f"Error: Cannot identify image file: {source_name}"); return None
+    except FileNotFoundError: print(f"Error: Input file not found: {source_name}"); return None
+    except PermissionError: print(f"Error: Permission denied for file: {source_name} or folder: {'<stream>' if to_stream else output_folder}"); return None
+    except ValueError as ve: print(f"Error processing {source_name} (ValueError): {ve}"); return None
+    except Exception as e: print(f"Error processing {source_name}: {e}"); return None
+    finally:
+        if partial_path is not None:
+            with contextlib.suppress(OSError): os.remove(partial_path) # Left behind only on failure
+
+
+def _write_canvas(canvas, output, output_ext, compression_settings, quantize, save_options, target, timings, start,
+                  gate_box=None, quality_report=None):
+    """Color-reduces (if on) and encodes one square canvas to output, then closes it. Returns the new lap start.
+
+    gate_box is the unpadded content box, for the quality gate (when on, lossy outputs go through _gated_encode).
+    Color reduction runs on the padded canvas so the padding shares the palette; palette-capable
+    outputs (PNG/GIF/BMP/TIFF) are saved as 8-bit P images, JPEG outputs go back to RGB.
+    """
+    is_jpeg = output_ext in ['.jpg', '.jpeg']
+    if (compression_settings.get("enabled", False) and compression_settings.get("quality_gate", {}).get("enabled")
+            and gate_box and (quantize or is_jpeg)):
+        if not numpy_available:
+            print("Skipping quality gate: NumPy is not installed.")
+        else:
+            canvas, data, report, start = _gated_encode(canvas, is_jpeg, compression_settings, quantize, save_options,
+                                                        target, gate_box, timings, start)
+            if quality_report is not None: quality_report.update(report)
+            if data is not None:
+                with _open_output(output) as f: f.write(data)
+                canvas.close()
+                return _lap(timings, "encode", start)
+            quantize = False # Already applied by the gate
+    if quantize:
+        canvas = _replace_image(canvas, apply_compression(canvas, compression_settings))
+        if output_ext in ['.jpg', '.jpeg'] and canvas.mode != 'RGB': canvas = _replace_image(canvas, canvas.convert('RGB'))
+        start = _lap(timings, "compress", start)
+    if output_ext == '.png' and save_options.get('optimize'):
+        data, report = optimize_png(canvas)
+        with _open_output(output) as f: f.write(data)
+        canvas.close()
+        print(f"PNG optimizer: {report}")
+        return _lap(timings, "optimize", start)
+    if target:
+        max_bytes, max_quality = target
+        quality, data, encodes = fit_jpeg_to_size(canvas, max_bytes, max_quality, save_options)
+        with _open_output(output) as f: f.write(data)
+        fits = "fits" if len(data) <= max_bytes else "still over target"
+        print(f"Target size {max_bytes} bytes: quality {quality} -> {len(data)} bytes ({fits}, {encodes} encodes)")
+    else:
+        canvas.save(output, format=Image.registered_extensions()[output_ext], **save_options)
+    canvas.close()
+    return _lap(timings, "encode", start)
+
+
+def _write_auto_canvas(canvas, output, compression_settings, quantize, optimize, choice, timings, start):
+    """_write_canvas for the auto_format option: picks the format, or reuses choice (extra sizes follow the main output).
+
+    Returns (choice, new lap start); choice is (format, quality or None).
+    """
+    if quantize:
+        canvas = _replace_image(canvas, apply_compression(canvas, compression_settings))
+        start = _lap(timings, "compress", start)
+    if choice is None:
+        choice, data, report = choose_format(canvas, compression_settings["auto_format"], optimize)
+        print(f"Auto format: {report}")
+    else:
+        data = _encode_format(canvas, choice[0], choice[1], optimize)
+    with _open_output(output) as f: f.write(data)
+    canvas.close()
+    return choice, _lap(timings, "encode", start)
+
+
+# --- Auto Trim ---
+def content_bbox(img, tolerance=0):
+    """(left, top, right, bottom) of img's content, or None if img is all border.
+
+    With alpha, content is every pixel more opaque than tolerance: getbbox() of the alpha band.
+    Without, it is every pixel differing by more than tolerance (in any band) from the top-left
+    pixel's color, so only a border that is uniform all the way round gets trimmed. One point()
+    lookup per band maps border colors to 0, so the scan runs in Pillow's C code, never per pixel.
+    """
+    if img.mode in ('RGBA', 'LA'):
+        mask = img.getchannel('A')
+        if tolerance > 0: mask = _replace_image(mask, mask.point([0] * (tolerance + 1) + [255] * (255 - tolerance)))
+    else:
+        border = img.getpixel((0, 0))
+        border = border if isinstance(border, tuple) else (border,)
+        mask = img.point([0 if abs(value - band) <= tolerance else 255 for band in border for value in range(256)])
+    box = mask.getbbox()
+    mask.close()
+    return box
+
+def trim_to_content(img, margin=0, tolerance=0):
+    """Crops img (RGB/RGBA) to content_bbox plus up to margin px of border; closes img unless it is returned.
+
+    The margin is clamped to the image, so it keeps border that was there rather than adding any.
+    An image with no content (e.g. fully transparent) is left as-is.
+    """
+    box = content_bbox(img, tolerance)
+    if box is None: return img
+    width, height = img.size
+    margin = max(0, int(margin))
+    box = (max(0, box[0] - margin), max(0, box[1] - margin), min(width, box[2] + margin), min(height, box[3] + margin))
+    if box == (0, 0, width, height): return img
+    return _replace_image(img, img.crop(box))
+
+
+# --- Quality Gate ---
+QUALITY_GATE_METRICS = ("ssim", "psnr")
+QUALITY_GATE_JPEG_STEP = 10 # JPEG quality added per back-off
+QUALITY_GATE_SSIM_WINDOW = 8 # SSIM window side, in (downsampled) pixels
+QUALITY_GATE_SSIM_SIDE = 256 # SSIM runs on the content box box-downsampled to about this short side
+
+def _premultiplied_luma_of_palette(img):
+    """L image of a P image's premultiplied luma: computed once per palette entry, then looked up per pixel."""
+    palette = img.getpalette('RGBA') or []
+    lut = [round((palette[i] * 299 + palette[i + 1] * 587 + palette[i + 2] * 114) / 1000 * palette[i + 3] / 255)
+           for i in range(0, len(palette), 4)] # Pillow's L weights (ITU-R 601-2)
+    return Image.frombytes('L', img.size, img.tobytes()).point(lut + [0] * (256 - len(lut)))
+
+def _gate_pixels(img, box, factor=1):
+    """float32 luma of img's content box, premultiplied by alpha (so hidden colors don't count).
+
+    factor > 1 box-downsamples by that much. Luma, premultiplying (L * A / 255, as La would
+    but without its slow full-size conversion) and reducing all run in Pillow's C code, so
+    NumPy only ever sees one small channel.
+    """
+    region = img.crop(box)
+    if _carries_alpha(region) and region.mode == 'P':
+        region = _premultiplied_luma_of_palette(region)
+    elif _carries_alpha(region):
+        bands = (region.convert('L'), region.getchannel('A')) if region.mode == 'RGBA' else region.convert('LA').split()
+        region = ImageChops.multiply(*bands)
+    elif region.mode != 'L':
+        region = region.convert('L')
+    if factor > 1: region = region.reduce(factor)
+    import numpy as np
+    return np.asarray(region, dtype=np.float32)
+
+def ssim(reference, candidate):
+    """Mean SSIM (Wang et al. 2004) between two _gate_pixels arrays; 1.0 means identical.
+
+    Callers pass arrays downsampled by ssim_factor (the usual viewing-distance scaling). Local
+    means/variances come from non-overlapping QUALITY_GATE_SSIM_WINDOW blocks (reshape + mean)
+    rather than a sliding window: within ~0.003 of the sliding score at a fraction of the cost.
+    """
+    import numpy as np
+    a, b = reference.astype(np.float64), candidate.astype(np.float64)
+    win = max(1, min(QUALITY_GATE_SSIM_WINDOW, *a.shape))
+    h, w = a.shape[0] // win * win, a.shape[1] // win * win
+    def block_means(x): return x[:h, :w].reshape(h // win, win, w // win, win).mean(axis=(1, 3))
+    mu_a, mu_b = block_means(a), block_means(b)
+    var_a = block_means(a * a) - mu_a * mu_a
+    var_b = block_means(b * b) - mu_b * mu_b
+    cov = block_means(a * b) - mu_a * mu_b
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+def ssim_factor(box):
+    """Downsampling factor that brings the box's short side to about QUALITY_GATE_SSIM_SIDE."""
+    return max(1, round(min(box[2] - box[0], box[3] - box[1]) / QUALITY_GATE_SSIM_SIDE))
+
+def psnr_pixels(reference, candidate):
+    """PSNR of the luma (Y-PSNR) in dB between two _gate_pixels arrays, capped at 100 (identical)."""
+    import numpy as np
+    mse = float(np.mean(np.square(reference - candidate), dtype=np.float64))
+    return 100.0 if mse == 0 else min(100.0, 10 * math.log10(255 * 255 / mse))
+
+def _gated_encode(canvas, is_jpeg, compression_settings, quantize, save_options, target, box, timings, start):
+    """Runs the lossy steps, scores the result on box against canvas, and backs off until the gate passes.
+
+    Back-off order: quantize colors are doubled (from 256 colors, or with a shared palette,
+    quantizing is dropped), then JPEG quality goes up QUALITY_GATE_JPEG_STEP at a time to 95.
+    With target_size, passing the gate wins over the size target. Returns (image, JPEG bytes
+    or None for other outputs, report, lap start); canvas is closed unless it is the image.
+    The report holds metric, score, min, passed and the settings that passed (colors/quality).
+    """
+    gate = compression_settings["quality_gate"]
+    metric = gate.get("metric", "ssim") if gate.get("metric") in QUALITY_GATE_METRICS else "ssim"
+    threshold = gate.get("min_ssim", 0.95) if metric == "ssim" else gate.get("min_psnr", 38.0)
+    score_fn = ssim if metric == "ssim" else psnr_pixels
+    factor = ssim_factor(box) if metric == "ssim" else 1 # PSNR counts every pixel
+    reference = _gate_pixels(canvas, box, factor)
+    start = _lap(timings, "gate", start)
+    settings = compression_settings
+    quality = None if target else save_options.get('quality', 75) # Pillow's own default is 75
+    backoffs = []
+    while True:
+        img = apply_compression(canvas, settings) if quantize else canvas
+        if quantize: start = _lap(timings, "compress", start)
+        data = None
+        if is_jpeg:
+            if img.mode != 'RGB':
+                rgb = img.convert('RGB')
+                if img is not canvas: img.close()
+                img = rgb
+            if quality is None:
+                quality, data, _ = fit_jpeg_to_size(img, target[0], target[1], save_options)
+            else:
+                buffer = io.BytesIO()
+                img.save(buffer, format="JPEG", **dict(save_options, quality=quality))
+                data = buffer.getvalue()
+            start = _lap(timings, "encode", start)
+            with Image.open(io.BytesIO(data)) as decoded:
+                decoded.draft('L', decoded.size) # The gate scores luma: skip chroma upsampling and color conversion
+                score = score_fn(reference, _gate_pixels(decoded, box, factor))
+        else:
+            score = score_fn(reference, _gate_pixels(img, box, factor))
+        start = _lap(timings, "gate", start)
+        passed = score >= threshold
+        if passed or not (quantize or (is_jpeg and quality < TARGET_SIZE_MAX_QUALITY)): break
+        if img is not canvas: img.close()
+        if quantize:
+            colors = settings["quantize"].get("colors", 256)
+            if settings["quantize"].get("palette") or colors >= 256:
+                quantize = False
+                backoffs.append("no color reduction")
+            else:
+                settings = copy.deepcopy(settings)
+                settings["quantize"]["colors"] = min(256, colors * 2)
+                backoffs.append(f"{settings['quantize']['colors']} colors")
+        else:
+            quality = min(TARGET_SIZE_MAX_QUALITY, quality + QUALITY_GATE_JPEG_STEP)
+            backoffs.append(f"quality {quality}")
+    if img is not canvas: canvas.close()
+    report = {"metric": metric, "score": round(score, 4), "min": threshold, "passed": passed}
+    if quantize: report["colors"] = settings["quantize"].get("colors")
+    if is_jpeg: report["quality"] = quality
+    print(f"Quality gate: {metric} {score:.4f} (min {threshold})" + (f" after backing off to {', '.join(backoffs)}" if backoffs else "")
+          + ("" if passed else ", still below the minimum"))
+    return img, data, report, start
+
+
+# --- Animated GIF/WebP ---
+ANIMATED_FORMATS = {"GIF": ".gif", "WEBP": ".webp"} # Source format -> animated output extension
+ANIMATED_WEBP_QUALITY = 90 # Lossy quality per WebP frame (lossless frames get huge fast)
+GIF_ALPHA_THRESHOLD = 128 # GIF has 1-bit transparency: alpha below this becomes the transparent index
+
+def is_animated(img):
+    return getattr(img, "is_animated", False) and img.format in ANIMATED_FORMATS
+
+def _padded_frames(img, mode, bg_color, max_dim, offset):
+    """Yields (canvas, duration ms, disposal) per frame, decoding frames one at a time.
+
+    The same canvas object is reused for every frame, so only the current source frame and
+    one canvas are ever in memory. Pillow hands frames over already composited (full size).
+    """
+    canvas = Image.new(mode, (max_dim, max_dim), bg_color)
+    for index in range(img.n_frames):
+        img.seek(index)
+        frame = img.convert(mode)
+        canvas.paste(bg_color, (0, 0, max_dim, max_dim))
+        canvas.paste(frame, offset, frame if mode == 'RGBA' else None)
+        frame.close()
+        yield canvas, int(img.info.get("duration", 0) or 0), getattr(img, "disposal_method", 0)
+    canvas.close()
+
+def _gif_frame(canvas):
+    """256-color P version of a canvas; for RGBA, index 255 is the transparent color."""
+    if canvas.mode != 'RGBA':
+        return canvas.quantize(256), None
+    frame = canvas.convert('RGB').quantize(255)
+    frame.putpalette((frame.getpalette() + [0] * 768)[:768])
+    transparent = canvas.getchannel('A').point(lambda a: 255 if a < GIF_ALPHA_THRESHOLD else 0, '1')
+    frame.paste(255, (0, 0) + canvas.size, transparent)
+    return frame, 255
+
+def _write_gif_animation(frames, output, max_dim, loop):
+    """Streams frames into an animated GIF: each frame is encoded and written as soon as it is padded.
+
+    Every frame is a full canvas with its own color table. Opaque animations keep each frame's
+    disposal; transparent ones restore to background, as a full frame's transparent pixels
+    must not show the previous frame through.
+    """
+    with _open_output(output) as f:
+        f.write(b"GIF89a" + struct.pack("<HHBBB", max_dim, max_dim, 0, 0, 0)) # No global color table
+        if loop is not None:
+            f.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+        for canvas, duration, disposal in frames:
+            frame, transparency = _gif_frame(canvas)
+            params = {"duration": duration, "disposal": 2 if transparency is not None else disposal,
+                      "include_color_table": True}
+            if transparency is not None: params["transparency"] = transparency
+            for data in GifImagePlugin.getdata(frame, (0, 0), **params):
+                f.write(data)
+            frame.close()
+        f.write(b";")
+
+def _webp_chunks(data):
+    """Yields (fourcc, payload) chunks of a still WebP file."""
+    pos = 12 # RIFF header
+    while pos + 8 <= len(data):
+        fourcc = data[pos:pos + 4]
+        size = struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        yield fourcc, data[pos + 8:pos + 8 + size]
+        pos += 8 + size + (size & 1)
+
+def _riff_chunk(fourcc, payload):
+    return fourcc + struct.pack("<I", len(payload)) + payload + (b"\x00" if len(payload) & 1 else b"")
+
+def _write_webp_animation(frames, output, max_dim, loop, has_alpha, quality=ANIMATED_WEBP_QUALITY):
+    """Streams frames into an animated WebP (VP8X + ANIM + one ANMF per frame).
+
+    Each frame is encoded as a still WebP by Pillow and its bitstream chunks are wrapped in an
+    ANMF frame; nothing but the current frame is kept. Frames are full canvases, so they are
+    written with blending off (they replace the canvas, alpha included).
+    """
+    with _open_output(output) as f:
+        start = f.tell()
+        f.write(b"RIFF\x00\x00\x00\x00WEBP") # Size is patched in at the end
+        flags = 0x02 | (0x10 if has_alpha else 0) # Animation, alpha
+        dims = (max_dim - 1).to_bytes(3, "little") * 2
+        f.write(_riff_chunk(b"VP8X", bytes([flags, 0, 0, 0]) + dims))
+        f.write(_riff_chunk(b"ANIM", bytes(4) + struct.pack("<H", loop or 0)))
+        for canvas, duration, disposal in frames:
+            buffer = io.BytesIO()
+            canvas.save(buffer, "WEBP", quality=quality, method=4)
+            bitstream = b"".join(_riff_chunk(fourcc, payload) for fourcc, payload in _webp_chunks(buffer.getvalue())
+                                 if fourcc in (b"ALPH", b"VP8 ", b"VP8L"))
+            header = bytes(6) + dims + min(duration, 0xFFFFFF).to_bytes(3, "little") + bytes([0x02]) # Don't blend
+            f.write(_riff_chunk(b"ANMF", header + bitstream))
+        end = f.tell()
+        f.seek(start + 4)
+        f.write(struct.pack("<I", end - start - 8))
+        f.seek(end)
+
+def square_animation(img, output, output_ext, mode, bg_color, max_dim, offset):
+    """Pads every frame of an animated GIF/WebP and writes an animated output, frame by frame.
+
+    Durations and loop count are kept (and GIF disposal, see _write_gif_animation).
+    """
+    frames = _padded_frames(img, mode, bg_color, max_dim, offset)
+    loop = img.info.get("loop")
+    if output_ext == '.gif':
+        _write_gif_animation(frames, output, max_dim, loop)
+    else:
+        _write_webp_animation(frames, output, max_dim, loop, mode == 'RGBA')
+
+
+# --- Multi-Resolution Outputs ---
+def _level_path(output_path, size):
+    """name_square.ext -> name_square_<size>.ext"""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}_{size}{ext}"
+
+def cascade_sizes(canvas, sizes, resample="lanczos"):
+    """Downscaled square copies of canvas for each size smaller than it, largest first.
+
+    Each level is resized from the previous (larger) level rather than from the full canvas,
+    so a 512 costs a 1024 -> 512 resize instead of 8192 -> 512. Returns [(size, image)].
+    """
+    resample_filter = RESAMPLE_FILTERS.get(resample, Image.Resampling.LANCZOS)
+    levels = []
+    previous = canvas
+    for size in sorted({int(size) for size in sizes}, reverse=True):
+        if size >= canvas.width or size < 1: continue # Never upscale; the full size is the _square output
+        previous = previous.resize((size, size), resample_filter)
+        levels.append((size, previous))
+    return levels
+
+
+# --- Max Output Size ---
+def draft_for_max_size(img, max_size):
+    """Before load(): lets the decoder skip resolution the max_size output will not use.
+
+    JPEG can decode at 1/2, 1/4 or 1/8 scale straight from the DCT data (Image.draft), which
+    cuts decode time and memory by up to 64x. The scale chosen never goes below the size
+    asked for, so the final resample in shrink_to_max_size only ever shrinks. Other formats
+    have no reduced decode and are left alone.
+    """
+    if img.format != "JPEG" or max(img.size) <= max_size: return
+    scale = max_size / max(img.size)
+    img.draft(img.mode, (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+
+def shrink_to_max_size(img, max_size, resample="lanczos"):
+    """Resizes img so its longest side is max_size (never enlarges); closes img if it is replaced.
+
+    reducing_gap makes Pillow box-reduce by a whole factor first (Image.reduce), which is
+    much cheaper than running the filter over every source pixel, then filter the rest.
+    """
+    if max(img.size) <= max_size: return img
+    scale = max_size / max(img.size)
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    resample_filter = RESAMPLE_FILTERS.get(resample, Image.Resampling.LANCZOS)
+    return _replace_image(img, img.resize(size, resample_filter, reducing_gap=MAX_SIZE_REDUCING_GAP))
+
+
+# --- Target-Size JPEG Search ---
+# Qualities chosen earlier in this process, keyed by image signature (see _quality_signature).
+# Each pool worker keeps its own, so a batch of similar textures converges after a few files.
+_quality_cache = {}
+
+def _quality_signature(img, max_bytes):
+    """(exact, broad) cache keys: exact matches near-identical canvases, broad matches same size/mode."""
+    broad = (img.size, img.mode, max_bytes)
+    thumb = img.convert('L').resize((4, 4), Image.Resampling.BOX)
+    exact = broad + (bytes(v >> 4 for v in thumb.tobytes()),)
+    return exact, broad
+
+def search_quality(fits, low, high, hint=None):
+    """Highest q in [low, high] with fits(q) True, assuming fits is monotonic (True below, False above).
+
+    With a hint the search gallops out from it, so a good hint costs ~2 probes; without
+    one it tries high first (small textures usually fit) and then bisects. Returns None if
+    nothing fits.
+    """
+    good, bad = low - 1, high + 1 # good always fits (or is below range), bad never does
+    if hint is None:
+        if fits(high): return high
+        bad = high
+    else:
+        hint = max(low, min(high, hint))
+        step = 1
+        if fits(hint):
+            good = hint
+            while good + step < bad:
+                if fits(good + step): good += step; step *= 2
+                else: bad = good + step; break
+        else:
+            bad = hint
+            while bad - step > good:
+                if fits(bad - step): good = bad - step; break
+                else: bad -= step; step *= 2
+    while bad - good > 1:
+        mid = (good + bad) // 2
+        if fits(mid): good = mid
+        else: bad = mid
+    return good if good >= low else None
+
+def fit_jpeg_to_size(img, max_bytes, max_quality=TARGET_SIZE_MAX_QUALITY, save_options=None):
+    """Encodes img (already padded) as JPEG at the highest quality whose output is <= max_bytes.
+
+    All trial encodes run in memory on the same canvas. Returns (quality, jpeg bytes, encodes);
+    if even TARGET_SIZE_MIN_QUALITY is too big, that smallest encode is returned.
+    """
+    save_options = {k: v for k, v in (save_options or {}).items() if k != 'quality'}
+    encoded = {}
+    def fits(quality):
+        if quality not in encoded:
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=quality, **save_options)
+            encoded[quality] = buffer.getvalue()
+        return len(encoded[quality]) <= max_bytes
+
+    low = min(TARGET_SIZE_MIN_QUALITY, max_quality)
+    exact, broad = _quality_signature(img, max_bytes)
+    hint = _quality_cache.get(exact, _quality_cache.get(broad))
+    quality = search_quality(fits, low, max_quality, hint)
+    if quality is None:
+        quality = low
+        fits(low)
+    _quality_cache[exact] = _quality_cache[broad] = quality
+    return quality, encoded[quality], len(encoded)
+
+
+# --- Low-Memory PNG Writer ---
+def _png_chunk(f, chunk_type, data):
+    f.write(struct.pack(">I", len(data)))
+    f.write(chunk_type)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF))
+
+def _filter_rows(raw, row_bytes, prev_row):
+    """PNG-filters one band of raw rows. Uses the Up filter with NumPy, None (type 0) without.
+
+    Returns (filtered bytes, last raw row) so the next band can continue the Up filter.
+    """
+    rows = len(raw) // row_bytes
+    if numpy_available:
+        import numpy as np
+        arr = np.frombuffer(raw, dtype=np.uint8).reshape(rows, row_bytes)
+        prev = np.frombuffer(prev_row, dtype=np.uint8)[None, :] if prev_row else np.zeros((1, row_bytes), np.uint8)
+        out = np.empty((rows, row_bytes + 1), dtype=np.uint8)
+        out[:, 0] = 2 # Up
+        np.subtract(arr, np.concatenate((prev, arr[:-1])), out=out[:, 1:])
+        return out.tobytes(), raw[-row_bytes:]
+    out = bytearray()
+    for i in range(0, len(raw), row_bytes):
+        out += b"\x00"
+        out += raw[i:i + row_bytes]
+    return bytes(out), raw[-row_bytes:]
+
+def _write_png_banded(img, output, mode, bg_color, max_dim, offset, compress_level):
+    """Writes img padded onto a max_dim x max_dim canvas as a PNG, one band of rows at a time.
+
+    Only one band of the canvas (plus one band of the converted source) exists at once, so
+    peak memory is the decoded source plus O(max_dim * PNG_BAND_ROWS) instead of max_dim².
+    Pixels match the canvas path exactly (same paste/mask semantics), only the encoder differs.
+    """
+    width, height = img.size
+    paste_x, paste_y = offset
+    row_bytes = max_dim * len(mode)
+    compressor = zlib.compressobj(compress_level)
+    prev_row = None
+    with _open_output(output) as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        _png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", max_dim, max_dim, 8, 6 if mode == 'RGBA' else 2, 0, 0, 0))
+        for y0 in range(0, max_dim, PNG_BAND_ROWS):
+            y1 = min(max_dim, y0 + PNG_BAND_ROWS)
+            band = Image.new(mode, (max_dim, y1 - y0), bg_color)
+            src_y0 = max(y0, paste_y) - paste_y
+            src_y1 = min(y1, paste_y + height) - paste_y
+            if src_y0 < src_y1:
+                piece = img.crop((0, src_y0, width, src_y1))
+                if piece.mode != mode: piece = _replace_image(piece, piece.convert(mode))
+                band.paste(piece, (paste_x, src_y0 + paste_y - y0), piece if mode == 'RGBA' else None)
+                piece.close()
+            filtered, prev_row = _filter_rows(band.tobytes(), row_bytes, prev_row)
+            band.close()
+            data = compressor.compress(filtered)
+            if data: _png_chunk(f, b"IDAT", data)
+        _png_chunk(f, b"IDAT", compressor.flush())
+        _png_chunk(f, b"IEND", b"")
+
+# --- Lossless PNG Optimizer ---
+PNG_FILTERS = ("none", "sub", "up", "average", "paeth", "adaptive") # Row filters tried by the NumPy encoder
+PNG_STRATEGIES = {"default": zlib.Z_DEFAULT_STRATEGY, "filtered": zlib.Z_FILTERED, "rle": zlib.Z_RLE}
+PNG_OPTIMIZE_LEVELS = (9,) # zlib levels searched; below 9 is almost never smaller
+PNG_OPTIMIZE_THREADS = 4 # zlib and NumPy release the GIL, so candidates encode in parallel
+PNG_SEARCH_MAX_PIXELS = 512 * 512 # Larger canvases run the search on a centered tile of about this many pixels
+PNG_FILTER_CHUNK_ROWS = 64 # Rows filtered per NumPy step, so temporaries stay small on any canvas
+PNG_SIGNATURE_THUMB = 64 # Side of the nearest-neighbour sample whose entropy classes the content
+PNG_COLOR_TYPES = {"L": 0, "RGB": 2, "LA": 4, "RGBA": 6}
+
+# Winning (encoder, filter, strategy, level) per image signature, per process (like _quality_cache)
+_png_params_cache = {}
+
+def _png_signature(img):
+    """Mode, transparency, size class (power of two) and entropy class (half bits) of a small sample.
+
+    Images alike in all of these (flat art vs photos vs noise) tend to pick the same PNG parameters.
+    """
+    sample = img.resize((PNG_SIGNATURE_THUMB, PNG_SIGNATURE_THUMB), Image.Resampling.NEAREST)
+    return img.mode, 'transparency' in img.info, max(img.size).bit_length(), round(sample.entropy() * 2)
+
+def _png_filtered(img, filter_name):
+    """Raw scanlines of img with one PNG filter type applied to every row (adaptive picks per row).
+
+    Rows go through in PNG_FILTER_CHUNK_ROWS chunks, so the int16 work arrays cost a few MB
+    whatever the canvas size; the output is the only full-size array.
+    """
+    import numpy as np
+    bpp = len(img.mode)
+    pixels = np.asarray(img, dtype=np.uint8).reshape(img.height, img.width * bpp)
+    out = np.empty((img.height, pixels.shape[1] + 1), dtype=np.uint8)
+    sad = np.minimum(np.arange(256), 256 - np.arange(256)).astype(np.uint8) # |byte as int8|, libpng's row cost
+    for top in range(0, img.height, PNG_FILTER_CHUNK_ROWS):
+        x = pixels[top:top + PNG_FILTER_CHUNK_ROWS].astype(np.int16)
+        a = np.zeros_like(x); a[:, bpp:] = x[:, :-bpp] # Left
+        b = np.empty_like(x); b[1:] = x[:-1]; b[0] = pixels[top - 1] if top else 0 # Up
+        predictors = {"none": 0, "sub": a, "up": b, "average": (a + b) >> 1}
+        if filter_name in ("paeth", "adaptive"):
+            c = np.zeros_like(b); c[:, bpp:] = b[:, :-bpp] # Up-left
+            p = a + b - c
+            pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+            predictors["paeth"] = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+        chunk = out[top:top + len(x)]
+        if filter_name != "adaptive":
+            chunk[:, 0] = PNG_FILTERS.index(filter_name)
+            chunk[:, 1:] = x - predictors[filter_name]
+            continue
+        # Minimum sum of absolute differences heuristic (what libpng does by default), best row kept as we go
+        best_cost = None
+        for filter_type, predictor in enumerate(predictors.values()):
+            rows = (x - predictor).astype(np.uint8)
+            cost = sad[rows].sum(axis=1, dtype=np.int32)
+            better = slice(None) if best_cost is None else cost < best_cost
+            chunk[better, 0] = filter_type
+            chunk[better, 1:] = rows[better]
+            best_cost = cost if best_cost is None else np.minimum(best_cost, cost)
+    return out.tobytes()
+
+def _encode_png_candidate(img, candidate, filtered=None):
+    """PNG bytes for one (encoder, filter, strategy, level) candidate."""
+    encoder, filter_name, strategy, level = candidate
+    if encoder == "pillow":
+        buffer = io.BytesIO()
+        # save() keeps its options on the image object, so candidates encoding in parallel each need their own
+        # "default" leaves compress_type unset: Pillow's own default is not Z_DEFAULT_STRATEGY for every mode
+        options = {} if strategy == "default" else {"compress_type": PNG_STRATEGIES[strategy]}
+        img.copy().save(buffer, "PNG", optimize=True, compress_level=level, **options)
+        return buffer.getvalue()
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, PNG_STRATEGIES[strategy])
+    idat = compressor.compress(filtered if filtered is not None else _png_filtered(img, filter_name)) + compressor.flush()
+    buffer = io.BytesIO()
+    buffer.write(b"\x89PNG\r\n\x1a\n")
+    _png_chunk(buffer, b"IHDR", struct.pack(">IIBBBBB", img.width, img.height, 8, PNG_COLOR_TYPES[img.mode], 0, 0, 0))
+    _png_chunk(buffer, b"IDAT", idat)
+    _png_chunk(buffer, b"IEND", b"")
+    return buffer.getvalue()
+
+def _png_candidates(img):
+    """Every parameter set worth trying for img. Pillow's own encoder (its default filtering) is always one."""
+    candidates = [("pillow", None, strategy, level) for strategy in PNG_STRATEGIES for level in PNG_OPTIMIZE_LEVELS]
+    if numpy_available and img.mode in PNG_COLOR_TYPES: # Paletted PNGs compress best unfiltered, which Pillow does
+        candidates += [("numpy", filter_name, strategy, level) for filter_name in PNG_FILTERS
+                       for strategy in ("default", "filtered") for level in PNG_OPTIMIZE_LEVELS]
+    return candidates
+
+def optimize_png(img):
+    """Losslessly smallest PNG encoding of img among filter/strategy/level candidates.
+
+    The first image of each signature (see _png_signature) tries every candidate, on a centered
+    tile of about PNG_SEARCH_MAX_PIXELS for larger canvases (it ranks them almost like the whole
+    image); later similar images reuse the winner and encode once. Returns (png bytes, report string).
+    """
+    start = time.perf_counter()
+    signature = _png_signature(img)
+    choice = _png_params_cache.get(signature)
+    if choice:
+        data = _encode_png_candidate(img, choice)
+        return data, f"{len(data)} bytes with cached {'/'.join(map(str, choice))} in {time.perf_counter() - start:.2f}s"
+
+    baseline = ("pillow", None, "default", 9) # What the optimize option did before: save(optimize=True)
+    sample = img
+    if img.width * img.height > PNG_SEARCH_MAX_PIXELS:
+        width = min(img.width, max(math.isqrt(PNG_SEARCH_MAX_PIXELS), PNG_SEARCH_MAX_PIXELS // img.height))
+        height = min(img.height, PNG_SEARCH_MAX_PIXELS // width)
+        left, top = (img.width - width) // 2, (img.height - height) // 2
+        sample = img.crop((left, top, left + width, top + height))
+    candidates = _png_candidates(img)
+    results = {} # Only the best so far and the baseline are kept, not every candidate's bytes
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PNG_OPTIMIZE_THREADS) as pool:
+        # Filter once per filter type and share it between strategies/levels
+        filtered = {name: pool.submit(_png_filtered, sample, name) for name in {c[1] for c in candidates if c[0] == "numpy"}}
+        encoded = pool.map(lambda c: _encode_png_candidate(sample, c, filtered[c[1]].result() if c[0] == "numpy" else None), candidates)
+        for candidate, data in zip(candidates, encoded):
+            if choice is None or len(data) < len(results[choice]):
+                if choice not in (None, baseline): del results[choice]
+                choice = candidate
+                results[candidate] = data
+            elif candidate == baseline:
+                results[candidate] = data
+    _png_params_cache[signature] = choice
+    saved = len(results[baseline]) - len(results[choice])
+    report = (f"{len(results[baseline])} -> {len(results[choice])} bytes (saved {saved}, {saved / len(results[baseline]):.1%}) "
+              f"with {'/'.join(map(str, choice))}, {len(candidates)} candidates")
+    if sample is not img:
+        sample.close()
+        results[choice] = _encode_png_candidate(img, choice)
+        report += f" on a {sample.width}x{sample.height} tile; {len(results[choice])} bytes"
+    return results[choice], report + f" in {time.perf_counter() - start:.2f}s"
+
+# --- Auto Format (smallest of PNG/JPEG/WebP) ---
+AUTO_FORMATS = ("png", "jpeg", "webp")
+AUTO_FORMAT_EXTENSIONS = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+AUTO_FORMAT_MAX_QUALITY = 95 # Top of the lossy quality search
+AUTO_FORMAT_THREADS = 4 # Candidate encodes run concurrently per image
+# Lossy quality that last met the PSNR floor, keyed by format + _quality_signature, per process
+_auto_quality_cache = {}
+
+def psnr(reference, candidate):
+    """Peak signal-to-noise ratio in dB between two same-size, same-mode images (inf if identical)."""
+    mse = sum(rms * rms for rms in ImageStat.Stat(ImageChops.difference(reference, candidate)).rms) / len(reference.getbands())
+    return math.inf if mse == 0 else 10 * math.log10(255 * 255 / mse)
+
+def _carries_alpha(img):
+    """True for any image with transparency, including quantized P images with an RGBA palette."""
+    return (img.mode in ('RGBA', 'LA', 'PA', 'RGBa') or 'transparency' in img.info
+            or (img.mode == 'P' and img.palette is not None and img.palette.mode == 'RGBA'))
+
+def _comparable(img, alpha=True):
+    """img as RGB, or premultiplied RGBa when it has transparency (and alpha is True).
+
+    Premultiplying zeroes the color under fully transparent pixels, which lossy encoders
+    are free to change, so it does not count against the PSNR.
+    """
+    if alpha and _carries_alpha(img):
+        return img if img.mode == 'RGBa' else img.convert('RGBA').convert('RGBa')
+    return img if img.mode == 'RGB' else img.convert('RGB')
+
+def _encode_format(canvas, fmt, quality=None, optimize=False):
+    """canvas encoded in memory as one auto-format candidate; quality None means lossless."""
+    if fmt == "png" and optimize: return optimize_png(canvas)[0]
+    buffer = io.BytesIO()
+    if fmt == "png":
+        canvas.save(buffer, format="PNG")
+    elif fmt == "jpeg":
+        rgb = canvas if canvas.mode == 'RGB' else canvas.convert('RGB')
+        rgb.save(buffer, format="JPEG", quality=quality, optimize=optimize)
+    elif quality is None:
+        canvas.save(buffer, format="WEBP", lossless=True)
+    else:
+        canvas.save(buffer, format="WEBP", quality=quality)
+    return buffer.getvalue()
+
+def _lossy_search(canvas, fmt, min_quality, min_psnr, optimize):
+    """Lowest quality in [min_quality, AUTO_FORMAT_MAX_QUALITY] whose fmt encode keeps min_psnr.
+
+    Each trial is encoded once and decoded once for the check (memoized); the search starts
+    from the quality similar canvases needed before. Returns (quality, bytes) or None.
+    """
+    reference = _comparable(canvas, alpha=fmt != "jpeg")
+    encoded = {}
+    def too_lossy(quality):
+        if quality not in encoded:
+            data = _encode_format(canvas, fmt, quality, optimize)
+            with Image.open(io.BytesIO(data)) as decoded:
+                encoded[quality] = (data, psnr(reference, _comparable(decoded, alpha=reference.mode == 'RGBa')))
+        return encoded[quality][1] < min_psnr
+
+    exact, broad = ((fmt,) + key for key in _quality_signature(canvas, min_psnr))
+    hint = _auto_quality_cache.get(exact, _auto_quality_cache.get(broad))
+    # search_quality finds the highest quality that is still too lossy; the one above it passes
+    failing = search_quality(too_lossy, min_quality, AUTO_FORMAT_MAX_QUALITY, hint)
+    quality = min_quality if failing is None else failing + 1
+    if quality > AUTO_FORMAT_MAX_QUALITY: return None
+    too_lossy(quality)
+    _auto_quality_cache[exact] = _auto_quality_cache[broad] = quality
+    return quality, encoded[quality][0]
+
+def choose_format(canvas, auto_settings, optimize=False):
+    """Encodes canvas as every allowed format at once and keeps the smallest that is good enough.
+
+    PNG and lossless WebP always qualify; JPEG (opaque canvases only) and lossy WebP must reach
+    min_psnr at some quality between min_quality and AUTO_FORMAT_MAX_QUALITY. The candidates run
+    on a thread pool (Pillow encoders release the GIL). Returns ((format, quality or None), bytes, report).
+    """
+    start = time.perf_counter()
+    formats = [fmt for fmt in auto_settings.get("formats", AUTO_FORMATS) if fmt in AUTO_FORMATS]
+    if "webp" in formats and not features.check("webp"): formats.remove("webp")
+    if _carries_alpha(canvas) and "jpeg" in formats: formats.remove("jpeg") # JPEG would drop the transparent padding
+    if not formats: formats = ["png"]
+    min_quality = max(1, min(AUTO_FORMAT_MAX_QUALITY, int(auto_settings.get("min_quality", 75))))
+    min_psnr = float(auto_settings.get("min_psnr", 40.0))
+
+    # save() keeps its options on the image object, so every concurrent candidate encodes its own copy
+    jobs = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=AUTO_FORMAT_THREADS) as pool:
+        for fmt in formats:
+            if fmt in ("png", "webp"):
+                jobs[(fmt, None)] = pool.submit(lambda fmt=fmt: _encode_format(canvas.copy(), fmt, None, optimize))
+            if fmt in ("jpeg", "webp"):
+                jobs[(fmt, "lossy")] = pool.submit(lambda fmt=fmt: _lossy_search(canvas.copy(), fmt, min_quality, min_psnr, optimize))
+        results = {}
+        for (fmt, kind), future in jobs.items():
+            result = future.result()
+            if kind is None: results[(fmt, None)] = result
+            elif result is not None: results[(fmt, result[0])] = result[1]
+    choice = min(results, key=lambda key: len(results[key]))
+    sizes = ", ".join(f"{fmt}{'' if q is None else f' q{q}'} {len(data)}" for (fmt, q), data in sorted(results.items(), key=lambda r: len(r[1])))
+    return choice, results[choice], f"{sizes} bytes in {time.perf_counter() - start:.2f}s"
+
+def estimate_job_bytes(entry, low_memory=False):
+    """Rough peak memory of squaring one planned file, from its header size.
+
+    Normal path: decoded source + a converted copy + the full 4-byte-per-pixel canvas.
+    Low-memory path: decoded source + one converted band + one canvas band.
+    """
+    if "size" not in entry or entry.get("action") in ("skip", "copy"): return 0
+    width, height = entry["size"]
+    max_dim = max(width, height)
+    source = width * height * 4
+    if low_memory:
+        return source + 2 * max_dim * PNG_BAND_ROWS * 4
+    return 2 * source + max_dim * max_dim * 4
+
+
+# --- Header Probe / Batch Plan ---
+# Modes whose squared output looks the same as the source, so a square file can be copied as-is
+COPYABLE_MODES = ('RGB', 'RGBA', 'L', 'LA', 'P')
+
+def probe_image(image_path):
+    """Reads only the image header. Returns {size, mode, format, transparency, color_key, animated}.
+
+    color_key is an RGB/L tRNS color: squaring drops it (the output is opaque), so such files are never copied.
+    """
+    with Image.open(image_path) as img: # Image.open is lazy; no pixel data is decoded here
+        return {
+            "size": img.size,
+            "mode": img.mode,
+            "format": img.format,
+            "transparency": _has_alpha(img),
+            "color_key": img.mode in ('RGB', 'L') and 'transparency' in img.info,
+            "animated": getattr(img, "is_animated", False),
+        }
+
+def plan_image(image_path, compression_settings, manifest=None):
+    """Decides what a batch will do with one file, from its header alone.
+
+    action is one of: "skip" (up to date or unreadable), "copy" (already square, no
+    compression, same output format: copied byte-for-byte), "convert" (square but
+    must be re-encoded) or "pad" (needs padding to square).
+    """
+    if manifest is not None:
+        cached_output = manifest.lookup(image_path, compression_settings)
+        if cached_output: return {"action": "skip", "reason": "up to date", "output": cached_output}
+    try:
+        header = probe_image(image_path)
+    except (UnidentifiedImageError, OSError) as e:
+        print(f"Error: Cannot read image header: {image_path}: {e}")
+        return {"action": "skip", "reason": "unreadable", "output": None}
+    width, height = header["size"]
+    entry = dict(header)
+    if width != height:
+        entry["action"] = "pad"
+        return entry
+    mode = 'RGBA' if header["transparency"] else 'RGB'
+    same_container = os.path.splitext(_output_path(image_path, "", mode))[1] == os.path.splitext(image_path)[1].lower()
+    if (not compression_settings.get("enabled", False) and same_container
+            and header["mode"] in COPYABLE_MODES and not header["animated"] and not header["color_key"]):
+        entry["action"] = "copy"
+    else:
+        entry["action"] = "convert"
+    return entry
+
+def plan_batch(input_files, compression_settings, manifest=None):
+    """Header-only pre-pass over a batch. Returns {image_path: plan entry} (see plan_image)."""
+    return {image_path: plan_image(image_path, compression_settings, manifest) for image_path in input_files}
+
+def summarize_plan(plan):
+    """Counts plan entries per action, e.g. {"pad": 10, "copy": 2, "convert": 0, "skip": 1}."""
+    counts = dict.fromkeys(("pad", "convert", "copy", "skip"), 0)
+    for entry in plan.values():
+        counts[entry["action"]] += 1
+    return counts
+
+def copy_square_image(image_path, output_folder, link=False):
+    """Materializes an already-square image as its _square output without decoding it.
+
+    link=True hard-links when possible (same volume), falling back to a copy.
+    """
+    try:
+        with Image.open(image_path) as img:
+            mode = 'RGBA' if _has_alpha(img) else 'RGB'
+        output_path = _output_path(image_path, output_folder, mode)
+        _place_file(image_path, output_path, link)
+        return output_path
+    except FileNotFoundError: print(f"Error: Input file not found: {image_path}"); return None
+    except PermissionError: print(f"Error: Permission denied for file: {image_path} or folder: {output_folder}"); return None
+    except Exception as e: print(f"Error copying {image_path}: {e}"); return None
+
+def _place_file(source_path, output_path, link=False):
+    """Copies source_path to output_path, or hard-links it (falling back to a copy) with link=True.
+
+    Either way the file appears at output_path only when complete (via a .part rename).
+    """
+    partial_path = output_path + PARTIAL_SUFFIX
+    if os.path.exists(partial_path): os.remove(partial_path)
+    try:
+        if link:
+            try:
+                os.link(source_path, partial_path)
+            except OSError:
+                link = False # Cross-device or unsupported filesystem
+        if not link: shutil.copyfile(source_path, partial_path)
+        os.replace(partial_path, output_path)
+    finally:
+        with contextlib.suppress(OSError): os.remove(partial_path)
+
+
+# --- Duplicate Detection ---
+DEDUP_LEVELS = ("bytes", "pixels")
+
+def dedup_key(image_path, level="bytes"):
+    """Key that is equal for duplicate inputs: (digest, output extension).
+
+    level "bytes" hashes the file; "pixels" hashes the decoded pixels (plus mode, size and
+    palette), so re-encodes of the same image match too. The output extension is part of
+    the key so a duplicate's output can take the primary's bytes under its expected name.
+    Returns None for unreadable files (they are never deduplicated).
+    """
+    try:
+        with Image.open(image_path) as img:
+            output_ext = os.path.splitext(_output_path(image_path, "", 'RGBA' if _has_alpha(img) else 'RGB'))[1]
+            if level == "pixels" and not getattr(img, "is_animated", False): # Only frame 0 would be hashed
+                img.load()
+                digest = hashlib.sha256(f"{img.mode}{img.size}{img.info.get('transparency')}".encode())
+                if img.mode == 'P': digest.update(bytes(img.getpalette() or []))
+                digest.update(img.tobytes())
+                return "pixels:" + digest.hexdigest(), output_ext
+        return "bytes:" + file_digest(image_path), output_ext
+    except Exception:
+        return None
+
+def find_duplicates(image_paths, level="bytes", workers=1):
+    """Groups image_paths by dedup_key. Returns (unique paths, {primary path: [duplicate paths]}).
+
+    Keys are computed on a thread pool (hashing and decoding release the GIL).
+    """
+    image_paths = list(image_paths)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        keys = list(pool.map(lambda path: dedup_key(path, level), image_paths))
+    primaries = {}
+    unique = []
+    duplicates = {}
+    for image_path, key in zip(image_paths, keys):
+        if key is not None and key in primaries:
+            duplicates.setdefault(primaries[key], []).append(image_path)
+            continue
+        if key is not None: primaries[key] = image_path
+        unique.append(image_path)
+    return unique, duplicates
+
+def materialize_duplicate(primary_output, duplicate_path, output_folder, link=False, sizes=()):
+    """Gives duplicate_path its own _square output by copying (or hard-linking) the primary's output.
+
+    sizes lists the extra _square_<size> outputs to copy along with it (those the primary has).
+    """
+    name = os.path.splitext(os.path.basename(duplicate_path))[0]
+    output_path = os.path.join(output_folder, f"{name}_square{os.path.splitext(primary_output)[1]}")
+    try:
+        if os.path.abspath(output_path) != os.path.abspath(primary_output):
+            _place_file(primary_output, output_path, link)
+            for size in sizes:
+                if os.path.exists(_level_path(primary_output, size)):
+                    _place_file(_level_path(primary_output, size), _level_path(output_path, size), link)
+        return output_path
+    except Exception as e:
+        print(f"Error writing duplicate output for {duplicate_path}: {e}")
+        return None
+
+
+# --- Batch Execution ---
+def _square_job(image_path, output_folder, compression_settings, action="pad", job_options=None):
+    """Top-level (picklable) job wrapper so process pools can run make_image_square.
+
+    job_options carries per-batch switches: link (hard-link copies), low_memory, and
+    instrument (adds info["timings"], seconds per stage plus "total").
+    With the quality gate on, info["quality"] holds the output's score (see _gated_encode).
+    """
+    job_options = job_options or {}
+    info = {"action": action}
+    timings = {} if job_options.get("instrument") else None
+    quality_report = {}
+    start = time.perf_counter()
+    if action == "copy":
+        output_path = copy_square_image(image_path, output_folder, job_options.get("link", False))
+        _lap(timings, "copy", start)
+    else:
+        output_path = make_image_square(image_path, output_folder, compression_settings,
+                                        job_options.get("low_memory", False), timings, quality_report)
+    if quality_report: info["quality"] = quality_report
+    if timings is not None:
+        timings["total"] = time.perf_counter() - start
+        info["timings"] = timings
+    return image_path, output_path, info
+
+def _read_input(image_path):
+    """Pipeline read stage: (file bytes or the OSError, seconds)."""
+    start = time.perf_counter()
+    try:
+        with open(image_path, "rb") as f: data = f.read()
+    except OSError as e:
+        data = e
+    return data, time.perf_counter() - start
+
+def _square_bytes_job(image_path, data, compression_settings, action="pad", job_options=None):
+    """Pipeline CPU stage (picklable): squares already-read bytes in memory.
+
+    Returns (image_path, output file name or None, output bytes, info), see _square_job.
+    """
+    job_options = job_options or {}
+    info = {"action": action}
+    timings = {} if job_options.get("instrument") else None
+    start = time.perf_counter()
+    source = io.BytesIO(data)
+    source.name = image_path
+    output = io.BytesIO()
+    quality_report = {}
+    output_name = make_image_square(source, output, compression_settings, job_options.get("low_memory", False), timings, quality_report)
+    if quality_report: info["quality"] = quality_report
+    if timings is not None:
+        timings["total"] = time.perf_counter() - start
+        info["timings"] = timings
+    return image_path, output_name, output.getvalue() if output_name else b"", info
+
+def _write_output(image_path, output_path, data, info):
+    """Pipeline write stage: writes bytes atomically (via .part), returns (image_path, output_path or None, info)."""
+    start = time.perf_counter()
+    partial_path = output_path + PARTIAL_SUFFIX
+    try:
+        with open(partial_path, "wb") as f: f.write(data)
+        _commit_output(partial_path, output_path)
+    except OSError as e:
+        print(f"Error writing {output_path}: {e}")
+        with contextlib.suppress(OSError): os.remove(partial_path)
+        output_path = None
+    if "timings" in info: info["timings"]["write"] = time.perf_counter() - start
+    return image_path, output_path, info
+
+def run_batch(input_files, output_folder, compression_settings, mode="serial", workers=1, should_stop=None,
+              manifest=None, plan=None, link_identical=False, low_memory=False, memory_budget_mb=0,
+              instrument=False, dedup=None, journal=None, lazy_plan=False):
+    """Squares input_files with the chosen executor, yielding (image_path, output_path, info) as each finishes.
+
+    mode is one of EXECUTOR_MODES. Results arrive in completion order, not input order.
+    "pipeline" overlaps I/O with CPU work for slow or high-latency drives (see _execute_pipelined).
+    should_stop is polled between results; once it returns True no new files are started
+    and files still queued are cancelled.
+    input_files may be any iterable, including a generator still discovering files (square_scan):
+    it is consumed lazily, so work starts with the first file. Items are paths or
+    (path, subfolder) pairs; a pair's output goes to output_folder/subfolder (created as needed).
+    manifest (a square_cache.BuildManifest) skips files whose output is already current;
+    those are yielded with info["skipped"] set. Successful outputs are recorded in it.
+    plan (from plan_batch) supplies the per-file action instead: "skip" entries are yielded
+    without work and "copy" entries are copied (or hard-linked with link_identical) undecoded.
+    lazy_plan=True plans each file (plan_image) as it is reached, for inputs too large or
+    too slow to plan up front.
+    Unreadable files come back with output_path None.
+    low_memory selects the band-wise PNG path. memory_budget_mb (needs a plan for sizes) caps
+    the summed estimate_job_bytes of jobs in flight, so big textures run fewer at a time.
+    instrument=True times each stage per file into info["timings"] (see square_report).
+    With quantize.reuse_palette on, one palette is built from the batch up front and shared by all jobs.
+    dedup ("bytes" or "pixels", see dedup_key) processes each distinct image once; its duplicates
+    are yielded right after it with info["action"] == "dedup" and info["duplicate_of"] set.
+    journal (a square_cache.RunJournal) gets every finished file as it completes; files it already
+    holds from an interrupted run are yielded as skipped ("resumed") without any checks or work.
+    """
+    should_stop = should_stop or (lambda: False)
+    if mode not in EXECUTOR_MODES:
+        raise ValueError(f"Unknown executor mode: {mode}")
+    workers = max(1, int(workers or 1))
+
+    job_options = {"link": link_identical, "low_memory": low_memory, "instrument": instrument}
+    memory_budget = int(memory_budget_mb * 1024 * 1024)
+    quantize = compression_settings.get("quantize", {})
+    shared_palette = (compression_settings.get("enabled") and quantize.get("enabled") and quantize.get("reuse_palette")
+                      and quantize.get("method", "palette") == "palette" and not quantize.get("palette"))
+    skipped = collections.deque() # Skip results met while jobs are being pulled, yielded between job results
+    job_folders = {} # image_path -> output folder, for duplicates
+    created_folders = set()
+
+    def job_stream():
+        for item in input_files:
+            if should_stop(): return
+            image_path, subfolder = item if isinstance(item, tuple) else (item, "")
+            job_folder = os.path.join(output_folder, subfolder) if subfolder else output_folder
+            if journal is not None and (journaled_output := journal.done(image_path)):
+                entry = {"action": "skip", "reason": "resumed", "output": journaled_output}
+            elif plan is not None:
+                entry = plan.get(image_path) or {"action": "pad"}
+            elif lazy_plan:
+                entry = plan_image(image_path, compression_settings, manifest)
+            elif manifest is not None and (cached_output := manifest.lookup(image_path, compression_settings)):
+                entry = {"action": "skip", "reason": "up to date", "output": cached_output}
+            else:
+                entry = {"action": "pad"}
+            if entry["action"] == "skip":
+                skipped.append((image_path, entry["output"], {"action": "skip", "skipped": entry["reason"]}))
+                continue
+            if job_folder not in created_folders:
+                os.makedirs(job_folder, exist_ok=True)
+                created_folders.add(job_folder)
+            if dedup: job_folders[image_path] = job_folder
+            cost = estimate_job_bytes(entry, low_memory) if memory_budget else 0
+            yield (image_path, job_folder, compression_settings, entry["action"], job_options), cost
+
+    try:
+        duplicates = {}
+        if dedup or shared_palette:
+            # Both need the whole batch before the first job, so this path cannot stream
+            jobs = list(job_stream())
+            while skipped: yield skipped.popleft()
+            if should_stop(): return
+            if dedup and len(jobs) > 1:
+                unique, duplicates = find_duplicates((job[0] for job, cost in jobs), dedup, workers)
+                unique = set(unique)
+                jobs = [(job, cost) for job, cost in jobs if job[0] in unique]
+            if shared_palette and jobs:
+                job_settings = copy.deepcopy(compression_settings)
+                job_settings["quantize"]["palette"] = build_batch_palette((job[0] for job, cost in jobs), quantize.get("colors", 256))
+                jobs = [((job[0], job[1], job_settings) + job[3:], cost) for job, cost in jobs]
+        else:
+            jobs = job_stream()
+
+        sizes = ()
+        if compression_settings.get("enabled") and compression_settings.get("sizes", {}).get("enabled"):
+            sizes = compression_settings["sizes"].get("sizes", ())
+        for image_path, output_path, info in _execute(jobs, mode, workers, should_stop, memory_budget):
+            while skipped: yield skipped.popleft()
+            if manifest is not None and output_path:
+                manifest.record(image_path, output_path, compression_settings)
+            if journal is not None and output_path:
+                journal.record(image_path, output_path)
+            yield image_path, output_path, info
+            for duplicate_path in duplicates.get(image_path, ()):
+                duplicate_output = None
+                if output_path:
+                    duplicate_output = materialize_duplicate(output_path, duplicate_path, job_folders[duplicate_path],
+                                                             link_identical, sizes)
+                if manifest is not None and duplicate_output:
+                    manifest.record(duplicate_path, duplicate_output, compression_settings)
+                if journal is not None and duplicate_output:
+                    journal.record(duplicate_path, duplicate_output)
+                yield duplicate_path, duplicate_output, {"action": "dedup", "duplicate_of": image_path}
+        while skipped: yield skipped.popleft()
+    finally:
+        if manifest is not None: manifest.save()
+        if journal is not None: journal.close()
+
+def _execute(jobs, mode, workers, should_stop, memory_budget=0):
+    """Runs _square_job over (argument tuple, estimated bytes) pairs on the chosen executor (see run_batch).
+
+    With a memory_budget a job is only admitted while the estimates of jobs in flight fit
+    under it; one job is always allowed so oversized textures still run (alone).
+    """
+    if mode == "pipeline":
+        yield from _execute_pipelined(jobs, workers, should_stop, memory_budget)
+        return
+    if mode == "serial" or workers == 1 or (isinstance(jobs, list) and len(jobs) <= 1):
+        for job, cost in jobs:
+            if should_stop(): return
+            yield _square_job(*job)
+        return
+
+    executor_cls = concurrent.futures.ProcessPoolExecutor if mode == "process" else concurrent.futures.ThreadPoolExecutor
+    # Keep only a couple of jobs per worker in flight so cancellation is quick
+    # and we never hold thousands of pending futures.
+    max_in_flight = workers * 2
+    pending_jobs = iter(jobs)
+    next_job = next(pending_jobs, None)
+    in_flight = {}
+    in_flight_cost = 0
+    executor = executor_cls(max_workers=workers)
+    try:
+        while True:
+            while next_job is not None and len(in_flight) < max_in_flight:
+                job, cost = next_job
+                if memory_budget and in_flight and in_flight_cost + cost > memory_budget: break
+                in_flight[executor.submit(_square_job, *job)] = cost
+                in_flight_cost += cost
+                next_job = next(pending_jobs, None)
+            if not in_flight: return
+
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                in_flight_cost -= in_flight.pop(future)
+                yield future.result()
+            if should_stop(): return
+    finally:
+        for future in in_flight: future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _execute_pipelined(jobs, workers, should_stop, memory_budget=0):
+    """Three-stage version of _execute: read ahead -> square on a process pool -> write in the background.
+
+    Reader threads keep up to PIPELINE_PREFETCH (+2 per worker) files' bytes ready, workers square
+    them in memory (_square_bytes_job), and writer threads flush the results, so the CPU rarely
+    waits on the drive. Every stage is bounded: prefetch depth, two jobs per worker, and at most
+    PIPELINE_WRITE_BACKLOG outputs waiting to be written (the CPU stage pauses when it is full).
+    Copies skip the CPU stage. Jobs with extra sizes (the "sizes" option) write several files
+    next to their output, so they skip the read-ahead and run _square_job on the pool instead.
+    """
+    prefetch = PIPELINE_PREFETCH + workers * 2
+    pending_jobs = iter(jobs)
+    reads = collections.deque() # ((args, cost), read future or None for copies), in input order
+    computing = {} # CPU future -> (output folder or None for _square_job results, cost, read seconds)
+    writing = set() # Write futures, each resolving to (image_path, output_path, info)
+    in_flight_cost = 0
+    io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=PIPELINE_IO_THREADS)
+    cpu_pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            while len(reads) < prefetch and (next_job := next(pending_jobs, None)) is not None:
+                args = next_job[0]
+                by_path = args[3] == "copy" or (args[2].get("enabled") and args[2].get("sizes", {}).get("enabled"))
+                reads.append((next_job, None if by_path else io_pool.submit(_read_input, args[0])))
+
+            while reads and (reads[0][1] is None or reads[0][1].done()):
+                (args, cost), read = reads[0]
+                if read is None and args[3] == "copy": # Copies are pure I/O
+                    writing.add(io_pool.submit(_square_job, *args))
+                    reads.popleft()
+                    continue
+                if len(computing) >= workers * 2 or len(writing) >= PIPELINE_WRITE_BACKLOG: break
+                if memory_budget and computing and in_flight_cost + cost > memory_budget: break
+                reads.popleft()
+                if read is None: # Extra sizes: the worker reads and writes its own files
+                    computing[cpu_pool.submit(_square_job, *args)] = (None, cost, 0.0)
+                    in_flight_cost += cost
+                    continue
+                data, read_seconds = read.result()
+                if isinstance(data, OSError):
+                    print(f"Error: Cannot read {args[0]}: {data}")
+                    writing.add(io_pool.submit(lambda path=args[0], action=args[3]: (path, None, {"action": action})))
+                    continue
+                image_path, output_folder, compression_settings, action, job_options = args
+                future = cpu_pool.submit(_square_bytes_job, image_path, data, compression_settings, action, job_options)
+                computing[future] = (output_folder, cost, read_seconds)
+                in_flight_cost += cost
+
+            if not reads and not computing and not writing: return
+            waiting = set(computing) | writing
+            if reads and reads[0][1] is not None and not reads[0][1].done(): waiting.add(reads[0][1])
+            done, _ = concurrent.futures.wait(waiting, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future in computing:
+                    output_folder, cost, read_seconds = computing.pop(future)
+                    in_flight_cost -= cost
+                    if output_folder is None:
+                        yield future.result()
+                        continue
+                    image_path, output_name, data, info = future.result()
+                    if "timings" in info: info["timings"]["read"] = read_seconds
+                    if output_name:
+                        writing.add(io_pool.submit(_write_output, image_path, os.path.join(output_folder, output_name), data, info))
+                    else:
+                        writing.add(io_pool.submit(lambda result=(image_path, None, info): result))
+                elif future in writing:
+                    writing.discard(future)
+                    yield future.result()
+            if should_stop(): return
+    finally:
+        for future in list(computing) + [read for job, read in reads if read is not None]: future.cancel()
+        io_pool.shutdown(wait=True, cancel_futures=True) # Let started writes finish
+        cpu_pool.shutdown(wait=False, cancel_futures=True)
+
+# --- Library API ---
+def square_images(paths, out_dir, settings=None, mode="serial", workers=1, should_stop=None,
+                  incremental=False, use_hash=False, link_identical=False, low_memory=False, memory_budget_mb=0,
+                  dedup=None, resume=False):
+    """Squares every image in paths into out_dir. Returns {input_path: output_path or None}.
+
+    settings is a compression settings dict shaped like DEFAULT_COMPRESSION_SETTINGS
+    (None means no compression). mode/workers pick the batch executor, see run_batch.
+    incremental=True skips sources whose output is current per the out_dir manifest.
+    Already-square files that need no re-encode are copied (or hard-linked) byte-for-byte.
+    low_memory/memory_budget_mb bound peak memory and dedup skips duplicate inputs, see run_batch.
+    Progress is journaled in out_dir; resume=True skips what an interrupted run already finished.
+    """
+    settings = copy.deepcopy(settings if settings is not None else DEFAULT_COMPRESSION_SETTINGS)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = None
+    if incremental:
+        manifest = BuildManifest(out_dir, use_hash=use_hash)
+    journal = RunJournal(out_dir, settings, resume=resume)
+    paths = list(paths)
+    plan = plan_batch(paths, settings, manifest)
+    results = dict.fromkeys(paths)
+    for image_path, output_path, info in run_batch(paths, out_dir, settings, mode=mode, workers=workers,
+                                                   should_stop=should_stop, manifest=manifest, plan=plan,
+                                                   link_identical=link_identical, low_memory=low_memory,
+                                                   memory_budget_mb=memory_budget_mb, dedup=dedup,
+                                                   journal=journal):
+        results[image_path] = output_path
+    return results
@@ -0,0 +1,1089 @@
+""" CustomTkinter GUI for the texture fixer. Imported lazily by image_square.main(). """
+import tkinter
+import tkinter.filedialog
+import customtkinter as ctk
+import copy
+import os
+import threading
+import sys # To get script directory
+
+from square_core import (
+    DEFAULT_COMPRESSION_SETTINGS, DEFAULT_BATCH_SETTINGS,
+    EXECUTOR_MODES, EXECUTOR_MODE_LABELS, CPU_COUNT, LOW_MEMORY_BUDGET_MB, RESAMPLE_FILTERS, AUTO_FORMATS,
+    run_batch, plan_batch, summarize_plan,
+)
+from square_cache import BuildManifest, RunJournal
+from square_report import RunReport, REPORT_FILENAME
+from square_progress import ProgressChannel, STATUS_LOG_LINES
+from square_scan import scan_images
+
+# --- Pygame for Audio ---
+try:
+    import pygame
+    pygame_available = True
+except ImportError:
+    pygame_available = False
+    print("Warning: Pygame not found. Music playback will be disabled.")
+    print("Install pygame: pip install pygame")
+
+# --- Constants ---
+# Color codes for visual impact labels
+COLOR_GREEN = "#34A853"  # Subtle/Lossless
+COLOR_YELLOW = "#FBBC05" # Barely Noticeable
+COLOR_ORANGE = "#F29900" # Noticeable
+COLOR_RED = "#EA4335"   # Highly Impactful
+
+SIZE_CHOICES = (256, 512, 1024, 2048) # Extra output sizes offered by the sizes option
+MAX_SIZE_CHOICES = (512, 1024, 2048, 4096) # Caps offered by the max_size option
+
+# --- Music Settings ---
+MUSIC_FILENAME = 'music.ogg'
+MUSIC_VOLUME = 0.15 # 15% volume
+
+      
+# --- Get Base Directory ---
+def get_base_dir():
+    """ Get the base directory for data files, handling frozen executables. """
+    if getattr(sys, 'frozen', False):
+        return sys._MEIPASS
+    else:
+        # Running as a normal Python script.
+        try:
+            # __file__ is the path to the current script.
+            return os.path.dirname(os.path.abspath(__file__))
+        except NameError:
+            # Fallback if __file__ is not defined (e.g., interactive interpreter)
+            return os.getcwd()
+
+BASE_DIR = get_base_dir()
+MUSIC_FILE_PATH = os.path.join(BASE_DIR, MUSIC_FILENAME)
+# ---------------------------------------------------------------------
+
+# --- GUI Application Class ---
+
+class ImageSquarifierApp(ctk.CTk):
+    def __init__(self):
+        super().__init__()
+
+        self.title("Texture Fixer for Tower Unite")
+        # Height for shit
+        self.geometry("600x780")
+        ctk.set_appearance_mode("System")
+        ctk.set_default_color_theme("blue")
+
+        self.input_files = []
+        self.input_folder = "" # Set instead of input_files when a whole folder tree is selected
+        self.output_folder = ""
+        self.processing_thread = None
+        self.stop_processing_flag = False
+        self.channel = ProgressChannel() # Worker -> UI updates, drained by process_queue
+        self.compression_settings = copy.deepcopy(DEFAULT_COMPRESSION_SETTINGS)
+        self.batch_settings = DEFAULT_BATCH_SETTINGS.copy()
+        self.compression_widgets = {}
+        self.music_playing = False
+        self.music_loaded = False
+        self.exit_splash = None # To hold reference to the exit window
+
+        # --- Initialize Pygame Mixer ---
+        self.initialize_audio()
+
+        # --- Configure grid layout ---
+        self.grid_columnconfigure(0, weight=1)
+        # Added row 0 for music control, shifted others down
+        self.grid_rowconfigure(0, weight=0) # Music Row
+        self.grid_rowconfigure(1, weight=0) # Input Row
+        self.grid_rowconfigure(2, weight=0) # Output Row
+        self.grid_rowconfigure(3, weight=0) # Compression Toggle Row
+        self.grid_rowconfigure(4, weight=0) # Convert Button Row
+        self.grid_rowconfigure(5, weight=1) # Compression Frame Row (expands vertically if needed)
+        self.grid_rowconfigure(6, weight=1) # Status Frame Row (expands vertically)
+
+
+        # MUSIC CONTROL
+        self.music_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.music_frame.grid(row=0, column=0, padx=20, pady=(10, 0), sticky="ew")
+        self.music_frame.grid_columnconfigure(0, weight=1) # Allow label to expand
+
+        self.mute_button = ctk.CTkButton(
+            self.music_frame,
+            text="Mute Music",
+            command=self.toggle_mute,
+            width=120
+        )
+        # right button???
+        self.mute_button.grid(row=0, column=1, padx=10, pady=5, sticky="e")
+
+        self.music_status_label = ctk.CTkLabel(self.music_frame, text="", text_color="gray", anchor="w")
+        self.music_status_label.grid(row=0, column=0, padx=10, pady=5, sticky="ew")
+
+        self.update_music_status_ui() # Set initial text/state
+
+        # input select
+        self.input_frame = ctk.CTkFrame(self)
+        self.input_frame.grid(row=1, column=0, padx=20, pady=(10, 10), sticky="ew") # Adjusted row
+        self.input_frame.grid_columnconfigure((0, 1), weight=1)
+        self.select_files_button = ctk.CTkButton(self.input_frame, text="Select Image Files", command=self.select_files)
+        self.select_files_button.grid(row=0, column=0, padx=(10, 5), pady=10, sticky="ew")
+        self.select_folder_button = ctk.CTkButton(self.input_frame, text="Select Folder (with subfolders)", command=self.select_input_folder)
+        self.select_folder_button.grid(row=0, column=1, padx=(5, 10), pady=10, sticky="ew")
+        self.input_label = ctk.CTkLabel(self.input_frame, text="No files selected.", text_color="gray", anchor="w")
+        self.input_label.grid(row=1, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="ew")
+
+        # input select 2
+        self.output_frame = ctk.CTkFrame(self)
+        self.output_frame.grid(row=2, column=0, padx=20, pady=10, sticky="ew") # Adjusted row
+        self.output_frame.grid_columnconfigure(0, weight=1)
+        self.select_output_button = ctk.CTkButton(self.output_frame, text="Select Output Folder", command=self.select_output_folder)
+        self.select_output_button.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
+        self.output_label = ctk.CTkLabel(self.output_frame, text="No output folder selected.", text_color="gray", anchor="w")
+        self.output_label.grid(row=1, column=0, padx=10, pady=(0, 10), sticky="ew")
+
+        # batch engine (executor + worker count)
+        self.engine_frame = ctk.CTkFrame(self.output_frame, fg_color="transparent")
+        self.engine_frame.grid(row=2, column=0, padx=10, pady=(0, 10), sticky="ew")
+        self.engine_frame.grid_columnconfigure(3, weight=1)
+        engine_label = ctk.CTkLabel(self.engine_frame, text="Engine:", anchor="w")
+        engine_label.grid(row=0, column=0, padx=(0, 5), sticky="w")
+        self.engine_menu = ctk.CTkOptionMenu(
+            self.engine_frame,
+            values=[EXECUTOR_MODE_LABELS[m] for m in EXECUTOR_MODES],
+            command=self.update_engine_mode,
+            width=130
+        )
+        self.engine_menu.set(EXECUTOR_MODE_LABELS[self.batch_settings["mode"]])
+        self.engine_menu.grid(row=0, column=1, padx=5, sticky="w")
+        workers_label = ctk.CTkLabel(self.engine_frame, text="Workers:", anchor="w")
+        workers_label.grid(row=0, column=2, padx=(10, 5), sticky="w")
+        self.workers_value = ctk.IntVar(value=self.batch_settings["workers"])
+        self.workers_slider = ctk.CTkSlider(
+            self.engine_frame, from_=1, to=max(2, CPU_COUNT), number_of_steps=max(1, CPU_COUNT - 1),
+            variable=self.workers_value,
+            command=lambda val: self.batch_settings.update(workers=int(val))
+        )
+        self.workers_slider.grid(row=0, column=3, padx=5, sticky="ew")
+        workers_display = ctk.CTkLabel(self.engine_frame, textvariable=self.workers_value, width=30)
+        workers_display.grid(row=0, column=4, padx=(5, 0))
+        self.incremental_var = ctk.BooleanVar(value=self.batch_settings["incremental"])
+        self.incremental_checkbox = ctk.CTkCheckBox(
+            self.engine_frame, text="Skip unchanged files (uncheck to rebuild everything)",
+            variable=self.incremental_var,
+            command=lambda: self.batch_settings.update(incremental=self.incremental_var.get())
+        )
+        self.incremental_checkbox.grid(row=1, column=0, columnspan=5, pady=(5, 0), sticky="w")
+        self.low_memory_var = ctk.BooleanVar(value=self.batch_settings["low_memory"])
+        self.low_memory_checkbox = ctk.CTkCheckBox(
+            self.engine_frame, text=f"Low memory mode (huge textures, ~{LOW_MEMORY_BUDGET_MB} MB budget)",
+            variable=self.low_memory_var,
+            command=self.toggle_low_memory
+        )
+        self.low_memory_checkbox.grid(row=2, column=0, columnspan=5, pady=(5, 0), sticky="w")
+        self.instrument_var = ctk.BooleanVar(value=self.batch_settings["instrument"])
+        self.instrument_checkbox = ctk.CTkCheckBox(
+            self.engine_frame, text=f"Time each stage (writes {REPORT_FILENAME})",
+            variable=self.instrument_var,
+            command=lambda: self.batch_settings.update(instrument=self.instrument_var.get())
+        )
+        self.instrument_checkbox.grid(row=3, column=0, columnspan=5, pady=(5, 0), sticky="w")
+        self.dedup_var = ctk.BooleanVar(value=bool(self.batch_settings["dedup"]))
+        self.dedup_checkbox = ctk.CTkCheckBox(
+            self.engine_frame, text="Process duplicate images only once",
+            variable=self.dedup_var,
+            command=lambda: self.batch_settings.update(dedup="bytes" if self.dedup_var.get() else None)
+        )
+        self.dedup_checkbox.grid(row=4, column=0, columnspan=5, pady=(5, 0), sticky="w")
+        self.resume_var = ctk.BooleanVar(value=self.batch_settings["resume"])
+        self.resume_checkbox = ctk.CTkCheckBox(
+            self.engine_frame, text="Resume the last interrupted run",
+            variable=self.resume_var,
+            command=lambda: self.batch_settings.update(resume=self.resume_var.get())
+        )
+        self.resume_checkbox.grid(row=5, column=0, columnspan=5, pady=(5, 0), sticky="w")
+
+        # input select 3
+        self.compression_toggle_checkbox = ctk.CTkCheckBox(
+            self,
+            text="Make My Textures Take Up Less Space! (Optional Compression)",
+            command=self.toggle_compression_frame,
+            variable=ctk.BooleanVar(value=self.compression_settings["enabled"]),
+            onvalue=True, offvalue=False
+        )
+        self.compression_toggle_checkbox.grid(row=3, column=0, padx=20, pady=(10, 5), sticky="w") # Adjusted row
+
+        # ACTION
+        self.convert_button = ctk.CTkButton(self, text="Convert to Square", command=self.start_conversion, state="disabled")
+        self.convert_button.grid(row=4, column=0, padx=20, pady=10, sticky="ew") # Adjusted row
+
+        # compression thingy
+        self.compression_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.compression_frame.grid_columnconfigure(0, weight=1)
+        self.create_compression_widgets(self.compression_frame)
+        
+
+        # status area
+        self.status_frame = ctk.CTkFrame(self)
+        self.status_frame.grid(row=6, column=0, padx=20, pady=(10, 20), sticky="nsew") # Adjusted row
+        self.status_frame.grid_columnconfigure(0, weight=1)
+        self.status_frame.grid_rowconfigure(0, weight=1)
+
+        self.status_textbox = ctk.CTkTextbox(self.status_frame, height=100, state="disabled", wrap="word")
+        self.status_textbox.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="nsew")
+        self._add_status("Ready. Select images and an output folder.")
+
+        self.progress_bar = ctk.CTkProgressBar(self.status_frame, orientation="horizontal")
+        self.progress_bar.set(0)
+        self.progress_bar.grid(row=1, column=0, padx=10, pady=(5, 10), sticky="ew")
+
+        # --- Initialize Compression Frame Visibility ---
+        self.toggle_compression_frame() # Set initial state based on checkbox
+
+        # --- Start Queue Checking ---
+        self.after(100, self.process_queue)
+
+        # --- Override Close Button Behavior ---
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+
+    # --- Audio Methods ---
+    def initialize_audio(self):
+        """Initializes pygame mixer and loads music."""
+        if not pygame_available:
+            self.music_loaded = False
+            return
+
+        print(f"Attempting to load music from: {MUSIC_FILE_PATH}")
+        if not os.path.exists(MUSIC_FILE_PATH):
+            print(f"!!! CRITICAL ERROR: Music file does NOT exist at expected runtime path: {MUSIC_FILE_PATH}")
+
+        try:
+            pygame.mixer.init()
+            if os.path.exists(MUSIC_FILE_PATH):
+                pygame.mixer.music.load(MUSIC_FILE_PATH)
+                pygame.mixer.music.set_volume(MUSIC_VOLUME)
+                pygame.mixer.music.play(loops=-1) # Play indefinitely
+                self.music_playing = True
+                self.music_loaded = True
+                print(f"Music loaded and playing: {MUSIC_FILENAME}")
+            else:
+                print(f"Error: Music file not found at: {MUSIC_FILE_PATH}")
+                self.music_loaded = False
+        except Exception as e:
+            print(f"Error initializing audio or playing music: {e}")
+            self.music_loaded = False
+            self.music_playing = False
+            if pygame.mixer.get_init(): # Quit mixer if init succeeded but load/play failed
+                pygame.mixer.quit()
+
+    def toggle_mute(self):
+        """Toggles music mute state."""
+        if not self.music_loaded or not pygame.mixer.get_init():
+            return # Do nothing if music isn't loaded/working
+
+        if self.music_playing:
+            pygame.mixer.music.pause()
+            self.music_playing = False
+        else:
+            pygame.mixer.music.unpause()
+            self.music_playing = True
+
+        self.update_music_status_ui()
+
+    def update_music_status_ui(self):
+        """Updates the mute button text and status label."""
+        if not self.music_loaded:
+            self.mute_button.configure(text="No Music", state="disabled")
+            self.music_status_label.configure(text="Audio disabled or file not found.")
+        elif self.music_playing:
+            self.mute_button.configure(text="Mute Music", state="normal")
+            self.music_status_label.configure(text=f"Made by Bear/Tovia")
+        else:
+            self.mute_button.configure(text="Unmute", state="normal")
+            self.music_status_label.configure(text="Music Muted")
+
+    # --- Compression Widget Creation --- all this shit was done with ai cause uhhhhh fuck if i know how to do it
+    # (create_compression_widgets remains unchanged from previous version)
+    def create_compression_widgets(self, parent_frame):
+        """Creates the widgets for individual compression options."""
+        self.compression_widgets = {} # Reset dict
+        current_row = 0
+
+        # --- Option 1: Strip Metadata ---
+        key = "strip_metadata"
+        frame = ctk.CTkFrame(parent_frame)
+        frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
+        frame.grid_columnconfigure(1, weight=1) # Allow label to take space
+
+        var = ctk.BooleanVar(value=self.compression_settings[key]["enabled"])
+        cb = ctk.CTkCheckBox(frame, text="", variable=var, command=lambda k=key, v=var: self.update_compression_setting(k, "enabled", v.get()), width=20)
+        cb.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="w")
+        label = ctk.CTkLabel(frame, text="Strip Metadata (Removes EXIF, etc.)", text_color=COLOR_GREEN, anchor="w")
+        label.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        self.compression_widgets[key] = {'frame': frame, 'var': var, 'checkbox': cb, 'label': label}
+        current_row += 1
+
+        # --- Option 2: Optimize (Pillow Built-in, plus the PNG optimizer for PNG outputs) ---
+        key = "optimize"
+        frame = ctk.CTkFrame(parent_frame)
+        frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
+        frame.grid_columnconfigure(1, weight=1)
+
+        var = ctk.BooleanVar(value=self.compression_settings[key]["enabled"])
+        cb = ctk.CTkCheckBox(frame, text="", variable=var, command=lambda k=key, v=var: self.update_compression_setting(k, "enabled", v.get()), width=20)
+        cb.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="w")
+        label = ctk.CTkLabel(frame, text="Optimize (Lossless/Minor Lossy)", text_color=COLOR_GREEN, anchor="w")
+        label.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        self.compression_widgets[key] = {'frame': frame, 'var': var, 'checkbox': cb, 'label': label}
+        current_row += 1
+
+        # --- Option 3: JPEG Quality ---
+        key = "jpeg_quality"
+        main_frame = ctk.CTkFrame(parent_frame) # Main frame for this option
+        main_frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        # Top part (checkbox, label, settings toggle)
+        top_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        top_frame.grid(row=0, column=0, sticky="ew")
+        top_frame.grid_columnconfigure(1, weight=1) # Label expands
+
+        var = ctk.BooleanVar(value=self.compression_settings[key]["enabled"])
+        cb = ctk.CTkCheckBox(top_frame, text="", variable=var, command=lambda k=key, v=var: self.toggle_compression_option_params(k, v.get()), width=20)
+        cb.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="w")
+        label = ctk.CTkLabel(top_frame, text="JPEG Quality (Requires JPEG Output)", text_color=COLOR_YELLOW, anchor="w")
+        label.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        settings_button = ctk.CTkButton(top_frame, text="▼ Settings", width=80, command=lambda k=key: self.toggle_settings_visibility(k))
+        settings_button.grid(row=0, column=2, padx=10, pady=5)
+
+        # Parameter Frame (initially maybe hidden)
+        param_frame = ctk.CTkFrame(main_frame) # Separate frame for params
+        param_frame.grid_columnconfigure(1, weight=1)
+
+        quality_label = ctk.CTkLabel(param_frame, text="Quality (1-100):", anchor="w")
+        quality_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        quality_value = ctk.IntVar(value=self.compression_settings[key]["value"])
+        quality_slider = ctk.CTkSlider(param_frame, from_=1, to=100, number_of_steps=99, variable=quality_value, command=lambda val, k=key, p="value": self.update_compression_setting(k, p, int(val)))
+        quality_slider.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        quality_display = ctk.CTkLabel(param_frame, textvariable=quality_value, width=35) # Display current value
+        quality_display.grid(row=0, column=2, padx=10, pady=5)
+
+        self.compression_widgets[key] = {
+            'frame': main_frame, 'var': var, 'checkbox': cb, 'label': label,
+            'settings_button': settings_button, 'param_frame': param_frame,
+            'param_visible': False, # State track for param visibility
+            'quality_slider': quality_slider, 'quality_value': quality_value,
+            'quality_display': quality_display
+        }
+        self.toggle_compression_option_params(key, var.get()) # Enable/disable controls
+        self.toggle_settings_visibility(key, show=False) # Hide params initially
+        current_row += 1
+
+        # --- Option 4: Quantize/Posterize (Color Reduction) ---
+        key = "quantize"
+        main_frame = ctk.CTkFrame(parent_frame)
+        main_frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        top_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        top_frame.grid(row=0, column=0, sticky="ew")
+        top_frame.grid_columnconfigure(1, weight=1)
+
+        var = ctk.BooleanVar(value=self.compression_settings[key]["enabled"])
+        cb = ctk.CTkCheckBox(top_frame, text="", variable=var, command=lambda k=key, v=var: self.toggle_compression_option_params(k, v.get()), width=20)
+        cb.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="w")
+        label = ctk.CTkLabel(top_frame, text="Reduce Colors (8-bit Palette)", text_color=COLOR_ORANGE, anchor="w")
+        label.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        settings_button = ctk.CTkButton(top_frame, text="▼ Settings", width=80, command=lambda k=key: self.toggle_settings_visibility(k))
+        settings_button.grid(row=0, column=2, padx=10, pady=5)
+
+        param_frame = ctk.CTkFrame(main_frame)
+        param_frame.grid_columnconfigure(1, weight=1)
+
+        colors_label = ctk.CTkLabel(param_frame, text="Max Colors:", anchor="w")
+        colors_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        colors_value = ctk.IntVar(value=self.compression_settings[key]["colors"])
+        colors_slider = ctk.CTkSlider(param_frame, from_=2, to=256, number_of_steps=254, variable=colors_value, command=lambda val, k=key, p="colors": self.update_compression_setting(k, p, int(val)))
+        colors_slider.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        colors_display = ctk.CTkLabel(param_frame, textvariable=colors_value, width=35)
+        colors_display.grid(row=0, column=2, padx=10, pady=5)
+        reuse_var = ctk.BooleanVar(value=self.compression_settings[key]["reuse_palette"])
+        reuse_checkbox = ctk.CTkCheckBox(param_frame, text="Share one palette across the whole batch", variable=reuse_var,
+                                         command=lambda k=key, v=reuse_var: self.update_compression_setting(k, "reuse_palette", v.get()))
+        reuse_checkbox.grid(row=1, column=0, columnspan=3, padx=10, pady=5, sticky="w")
+
+        self.compression_widgets[key] = {
+            'frame': main_frame, 'var': var, 'checkbox': cb, 'label': label,
+            'settings_button': settings_button, 'param_frame': param_frame,
+            'param_visible': False,
+            'colors_slider': colors_slider, 'colors_value': colors_value,
+            'colors_display': colors_display, 'reuse_checkbox': reuse_checkbox
+        }
+        self.toggle_compression_option_params(key, var.get())
+        self.toggle_settings_visibility(key, show=False)
+        current_row += 1
+
+        # --- Option 5: Target File Size (JPEG quality search) ---
+        key = "target_size"
+        main_frame = ctk.CTkFrame(parent_frame)
+        main_frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        top_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        top_frame.grid(row=0, column=0, sticky="ew")
+        top_frame.grid_columnconfigure(1, weight=1)
+
+        var = ctk.BooleanVar(value=self.compression_settings[key]["enabled"])
+        cb = ctk.CTkCheckBox(top_frame, text="", variable=var, command=lambda k=key, v=var: self.toggle_compression_option_params(k, v.get()), width=20)
+        cb.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="w")
+        label = ctk.CTkLabel(top_frame, text="Target Max File Size (Auto JPEG Quality)", text_color=COLOR_YELLOW, anchor="w")
+        label.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        settings_button = ctk.CTkButton(top_frame, text="▼ Settings", width=80, command=lambda k=key: self.toggle_settings_visibility(k))
+        settings_button.grid(row=0, column=2, padx=10, pady=5)
+
+        param_frame = ctk.CTkFrame(main_frame)
+        param_frame.grid_columnconfigure(1, weight=1)
+
+        size_label = ctk.CTkLabel(param_frame, text="Max Size (KB):", anchor="w")
+        size_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        size_value = ctk.IntVar(value=self.compression_settings[key]["max_kb"])
+        size_slider = ctk.CTkSlider(param_frame, from_=32, to=8192, number_of_steps=255, variable=size_value, command=lambda val, k=key, p="max_kb": self.update_compression_setting(k, p, int(val)))
+        size_slider.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        size_display = ctk.CTkLabel(param_frame, textvariable=size_value, width=45)
+        size_display.grid(row=0, column=2, padx=10, pady=5)
+
+        self.compression_widgets[key] = {
+            'frame': main_frame, 'var': var, 'checkbox': cb, 'label': label,
+            'settings_button': settings_button, 'param_frame': param_frame,
+            'param_visible': False,
+            'size_slider': size_slider, 'size_value': size_value,
+            'size_display': size_display
+        }
+        self.toggle_compression_option_params(key, var.get())
+        self.toggle_settings_visibility(key, show=False)
+        current_row += 1
+
+        # --- Option 6: Extra Power-of-Two Sizes ---
+        key = "sizes"
+        main_frame = ctk.CTkFrame(parent_frame)
+        main_frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        top_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        top_frame.grid(row=0, column=0, sticky="ew")
+        top_frame.grid_columnconfigure(1, weight=1)
+
+        var = ctk.BooleanVar(value=self.compression_settings[key]["enabled"])
+        cb = ctk.CTkCheckBox(top_frame, text="", variable=var, command=lambda k=key, v=var: self.toggle_compression_option_params(k, v.get()), width=20)
+        cb.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="w")
+        label = ctk.CTkLabel(top_frame, text="Also Save Smaller Power-of-Two Sizes", text_color=COLOR_YELLOW, anchor="w")
+        label.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        settings_button = ctk.CTkButton(top_frame, text="▼ Settings", width=80, command=lambda k=key: self.toggle_settings_visibility(k))
+        settings_button.grid(row=0, column=2, padx=10, pady=5)
+
+        param_frame = ctk.CTkFrame(main_frame)
+        size_checkboxes = []
+        for column, size in enumerate(SIZE_CHOICES):
+            size_var = ctk.BooleanVar(value=size in self.compression_settings[key]["sizes"])
+            size_cb = ctk.CTkCheckBox(param_frame, text=str(size), variable=size_var, width=60,
+                                      command=lambda s=size, v=size_var: self.toggle_output_size(s, v.get()))
+            size_cb.grid(row=0, column=column, padx=(10, 0), pady=5, sticky="w")
+            size_checkboxes.append(size_cb)
+        resample_label = ctk.CTkLabel(param_frame, text="Filter:", anchor="w")
+        resample_label.grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        resample_menu = ctk.CTkOptionMenu(param_frame, values=list(RESAMPLE_FILTERS), width=110,
+                                          command=lambda val, k=key, p="resample": self.update_compression_setting(k, p, val))
+        resample_menu.set(self.compression_settings[key]["resample"])
+        resample_menu.grid(row=1, column=1, columnspan=3, padx=5, pady=5, sticky="w")
+
+        self.compression_widgets[key] = {
+            'frame': main_frame, 'var': var, 'checkbox': cb, 'label': label,
+            'settings_button': settings_button, 'param_frame': param_frame,
+            'param_visible': False,
+            'size_checkboxes': size_checkboxes, 'resample_menu': resample_menu
+        }
+        self.toggle_compression_option_params(key, var.get())
+        self.toggle_settings_visibility(key, show=False)
+        current_row += 1
+
+        # --- Option 7: Max Output Size (reduced JPEG decode + resample) ---
+        key = "max_size"
+        main_frame = ctk.CTkFrame(parent_frame)
+        main_frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        top_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        top_frame.grid(row=0, column=0, sticky="ew")
+        top_frame.grid_columnconfigure(1, weight=1)
+
+        var = ctk.BooleanVar(value=self.compression_settings[key]["enabled"])
+        cb = ctk.CTkCheckBox(top_frame, text="", variable=var, command=lambda k=key, v=var: self.toggle_compression_option_params(k, v.get()), width=20)
+        cb.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="w")
+        label = ctk.CTkLabel(top_frame, text="Max Output Size (Shrinks Large Images)", text_color=COLOR_ORANGE, anchor="w")
+        label.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        settings_button = ctk.CTkButton(top_frame, text="▼ Settings", width=80, command=lambda k=key: self.toggle_settings_visibility(k))
+        settings_button.grid(row=0, column=2, padx=10, pady=5)
+
+        param_frame = ctk.CTkFrame(main_frame)
+        max_size_label = ctk.CTkLabel(param_frame, text="Max Side (px):", anchor="w")
+        max_size_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        max_size_menu = ctk.CTkOptionMenu(param_frame, values=[str(size) for size in MAX_SIZE_CHOICES], width=110,
+                                          command=lambda val, k=key, p="value": self.update_compression_setting(k, p, int(val)))
+        max_size_menu.set(str(self.compression_settings[key]["value"]))
+        max_size_menu.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        resample_label = ctk.CTkLabel(param_frame, text="Filter:", anchor="w")
+        resample_label.grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        resample_menu = ctk.CTkOptionMenu(param_frame, values=list(RESAMPLE_FILTERS), width=110,
+                                          command=lambda val, k=key, p="resample": self.update_compression_setting(k, p, val))
+        resample_menu.set(self.compression_settings[key]["resample"])
+        resample_menu.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+
+        self.compression_widgets[key] = {
+            'frame': main_frame, 'var': var, 'checkbox': cb, 'label': label,
+            'settings_button': settings_button, 'param_frame': param_frame,
+            'param_visible': False,
+            'max_size_menu': max_size_menu, 'resample_menu': resample_menu
+        }
+        self.toggle_compression_option_params(key, var.get())
+        self.toggle_settings_visibility(key, show=False)
+        current_row += 1
+
+        # --- Option 8: Auto Format (smallest of PNG/JPEG/WebP) ---
+        key = "auto_format"
+        main_frame = ctk.CTkFrame(parent_frame)
+        main_frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        top_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        top_frame.grid(row=0, column=0, sticky="ew")
+        top_frame.grid_columnconfigure(1, weight=1)
+
+        var = ctk.BooleanVar(value=self.compression_settings[key]["enabled"])
+        cb = ctk.CTkCheckBox(top_frame, text="", variable=var, command=lambda k=key, v=var: self.toggle_compression_option_params(k, v.get()), width=20)
+        cb.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="w")
+        label = ctk.CTkLabel(top_frame, text="Auto Format (Smallest of PNG/JPEG/WebP)", text_color=COLOR_YELLOW, anchor="w")
+        label.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        settings_button = ctk.CTkButton(top_frame, text="▼ Settings", width=80, command=lambda k=key: self.toggle_settings_visibility(k))
+        settings_button.grid(row=0, column=2, padx=10, pady=5)
+
+        param_frame = ctk.CTkFrame(main_frame)
+        param_frame.grid_columnconfigure(1, weight=1)
+
+        psnr_label = ctk.CTkLabel(param_frame, text="Min PSNR (dB):", anchor="w")
+        psnr_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        psnr_value = ctk.IntVar(value=int(self.compression_settings[key]["min_psnr"]))
+        psnr_slider = ctk.CTkSlider(param_frame, from_=30, to=50, number_of_steps=20, variable=psnr_value, command=lambda val, k=key, p="min_psnr": self.update_compression_setting(k, p, float(int(val))))
+        psnr_slider.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        psnr_display = ctk.CTkLabel(param_frame, textvariable=psnr_value, width=35)
+        psnr_display.grid(row=0, column=2, padx=10, pady=5)
+        format_checkboxes = []
+        formats_frame = ctk.CTkFrame(param_frame, fg_color="transparent")
+        formats_frame.grid(row=1, column=0, columnspan=3, sticky="w")
+        for column, fmt in enumerate(AUTO_FORMATS):
+            format_var = ctk.BooleanVar(value=fmt in self.compression_settings[key]["formats"])
+            format_cb = ctk.CTkCheckBox(formats_frame, text=fmt.upper(), variable=format_var, width=70,
+                                        command=lambda f=fmt, v=format_var: self.toggle_auto_format(f, v.get()))
+            format_cb.grid(row=0, column=column, padx=(10, 0), pady=5, sticky="w")
+            format_checkboxes.append(format_cb)
+
+        self.compression_widgets[key] = {
+            'frame': main_frame, 'var': var, 'checkbox': cb, 'label': label,
+            'settings_button': settings_button, 'param_frame': param_frame,
+            'param_visible': False,
+            'psnr_slider': psnr_slider, 'psnr_value': psnr_value,
+            'psnr_display': psnr_display, 'format_checkboxes': format_checkboxes
+        }
+        self.toggle_compression_option_params(key, var.get())
+        self.toggle_settings_visibility(key, show=False)
+        current_row += 1
+
+        # --- Option 9: Quality Gate (SSIM check on lossy outputs) ---
+        key = "quality_gate"
+        main_frame = ctk.CTkFrame(parent_frame)
+        main_frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        top_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        top_frame.grid(row=0, column=0, sticky="ew")
+        top_frame.grid_columnconfigure(1, weight=1)
+
+        var = ctk.BooleanVar(value=self.compression_settings[key]["enabled"])
+        cb = ctk.CTkCheckBox(top_frame, text="", variable=var, command=lambda k=key, v=var: self.toggle_compression_option_params(k, v.get()), width=20)
+        cb.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="w")
+        label = ctk.CTkLabel(top_frame, text="Quality Gate (Backs Off Colors/JPEG Quality)", text_color=COLOR_GREEN, anchor="w")
+        label.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        settings_button = ctk.CTkButton(top_frame, text="▼ Settings", width=80, command=lambda k=key: self.toggle_settings_visibility(k))
+        settings_button.grid(row=0, column=2, padx=10, pady=5)
+
+        param_frame = ctk.CTkFrame(main_frame)
+        param_frame.grid_columnconfigure(1, weight=1)
+
+        ssim_label = ctk.CTkLabel(param_frame, text="Min SSIM (%):", anchor="w")
+        ssim_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        ssim_value = ctk.IntVar(value=round(self.compression_settings[key]["min_ssim"] * 100))
+        ssim_slider = ctk.CTkSlider(param_frame, from_=80, to=99, number_of_steps=19, variable=ssim_value, command=lambda val, k=key, p="min_ssim": self.update_compression_setting(k, p, int(val) / 100))
+        ssim_slider.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        ssim_display = ctk.CTkLabel(param_frame, textvariable=ssim_value, width=35)
+        ssim_display.grid(row=0, column=2, padx=10, pady=5)
+
+        self.compression_widgets[key] = {
+            'frame': main_frame, 'var': var, 'checkbox': cb, 'label': label,
+            'settings_button': settings_button, 'param_frame': param_frame,
+            'param_visible': False,
+            'ssim_slider': ssim_slider, 'ssim_value': ssim_value,
+            'ssim_display': ssim_display
+        }
+        self.toggle_compression_option_params(key, var.get())
+        self.toggle_settings_visibility(key, show=False)
+        current_row += 1
+
+        # --- Option 10: Auto Trim (crop empty borders before squaring) ---
+        key = "trim"
+        main_frame = ctk.CTkFrame(parent_frame)
+        main_frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
+        main_frame.grid_columnconfigure(1, weight=1)
+
+        top_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        top_frame.grid(row=0, column=0, sticky="ew")
+        top_frame.grid_columnconfigure(1, weight=1)
+
+        var = ctk.BooleanVar(value=self.compression_settings[key]["enabled"])
+        cb = ctk.CTkCheckBox(top_frame, text="", variable=var, command=lambda k=key, v=var: self.toggle_compression_option_params(k, v.get()), width=20)
+        cb.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="w")
+        label = ctk.CTkLabel(top_frame, text="Auto Trim (Crops Transparent/Uniform Borders)", text_color=COLOR_ORANGE, anchor="w")
+        label.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        settings_button = ctk.CTkButton(top_frame, text="▼ Settings", width=80, command=lambda k=key: self.toggle_settings_visibility(k))
+        settings_button.grid(row=0, column=2, padx=10, pady=5)
+
+        param_frame = ctk.CTkFrame(main_frame)
+        param_frame.grid_columnconfigure(1, weight=1)
+
+        margin_label = ctk.CTkLabel(param_frame, text="Margin (px):", anchor="w")
+        margin_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        margin_value = ctk.IntVar(value=self.compression_settings[key]["margin"])
+        margin_slider = ctk.CTkSlider(param_frame, from_=0, to=64, number_of_steps=64, variable=margin_value, command=lambda val, k=key, p="margin": self.update_compression_setting(k, p, int(val)))
+        margin_slider.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        margin_display = ctk.CTkLabel(param_frame, textvariable=margin_value, width=35)
+        margin_display.grid(row=0, column=2, padx=10, pady=5)
+        tolerance_label = ctk.CTkLabel(param_frame, text="Tolerance:", anchor="w")
+        tolerance_label.grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        tolerance_value = ctk.IntVar(value=self.compression_settings[key]["tolerance"])
+        tolerance_slider = ctk.CTkSlider(param_frame, from_=0, to=64, number_of_steps=64, variable=tolerance_value, command=lambda val, k=key, p="tolerance": self.update_compression_setting(k, p, int(val)))
+        tolerance_slider.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
+        tolerance_display = ctk.CTkLabel(param_frame, textvariable=tolerance_value, width=35)
+        tolerance_display.grid(row=1, column=2, padx=10, pady=5)
+
+        self.compression_widgets[key] = {
+            'frame': main_frame, 'var': var, 'checkbox': cb, 'label': label,
+            'settings_button': settings_button, 'param_frame': param_frame,
+            'param_visible': False,
+            'margin_slider': margin_slider, 'margin_value': margin_value,
+            'tolerance_slider': tolerance_slider, 'tolerance_value': tolerance_value
+        }
+        self.toggle_compression_option_params(key, var.get())
+        self.toggle_settings_visibility(key, show=False)
+        current_row += 1
+
+
+    # --- GUI Methods ---
+    # (toggle_compression_frame, update_compression_setting,
+    # toggle_compression_option_params, toggle_settings_visibility,
+    # select_files, select_output_folder, check_conversion_ready,
+    # start_conversion, _add_status, _update_progress, _clear_status,
+    # process_queue remain unchanged from previous version)
+
+    def toggle_compression_frame(self):
+        """Shows or hides the compression options frame based on the main checkbox."""
+        is_enabled = self.compression_toggle_checkbox.get()
+        self.compression_settings["enabled"] = is_enabled
+        if is_enabled:
+            # Place it in grid (Adjusted row index)
+            self.compression_frame.grid(row=5, column=0, padx=20, pady=5, sticky="nsew")
+        else:
+            self.compression_frame.grid_remove()
+
+    def update_engine_mode(self, label):
+        """Maps the engine dropdown label back to an executor mode."""
+        for mode, mode_label in EXECUTOR_MODE_LABELS.items():
+            if mode_label == label:
+                self.batch_settings["mode"] = mode
+        self.workers_slider.configure(state="disabled" if self.batch_settings["mode"] == "serial" else "normal")
+
+    def toggle_low_memory(self):
+        """Low memory mode switches on band-wise encoding and the memory-budget scheduler together."""
+        enabled = self.low_memory_var.get()
+        self.batch_settings["low_memory"] = enabled
+        self.batch_settings["memory_budget_mb"] = LOW_MEMORY_BUDGET_MB if enabled else 0
+
+    def update_compression_setting(self, key, param, value):
+        """Updates a specific compression setting value."""
+        if key in self.compression_settings:
+            if param in self.compression_settings[key]:
+                self.compression_settings[key][param] = value
+            else:
+                self.compression_settings[key]["enabled"] = value
+
+    def toggle_output_size(self, size, selected):
+        """Adds or removes one of the extra output sizes."""
+        sizes = set(self.compression_settings["sizes"]["sizes"])
+        if selected: sizes.add(size)
+        else: sizes.discard(size)
+        self.compression_settings["sizes"]["sizes"] = sorted(sizes)
+
+    def toggle_auto_format(self, fmt, selected):
+        """Adds or removes one of the formats auto format may pick."""
+        formats = [f for f in self.compression_settings["auto_format"]["formats"] if f != fmt]
+        if selected: formats.append(fmt)
+        self.compression_settings["auto_format"]["formats"] = [f for f in AUTO_FORMATS if f in formats]
+
+    def toggle_compression_option_params(self, key, is_enabled):
+         """Enables/disables parameter controls when an option is checked/unchecked."""
+         self.update_compression_setting(key, "enabled", is_enabled)
+         widgets = self.compression_widgets.get(key, {})
+         param_state = "normal" if is_enabled else "disabled"
+
+         if 'settings_button' in widgets:
+             widgets['settings_button'].configure(state=param_state)
+             if not is_enabled and widgets.get('param_visible'):
+                 self.toggle_settings_visibility(key, show=False)
+
+         if 'quality_slider' in widgets: widgets['quality_slider'].configure(state=param_state)
+         if 'colors_slider' in widgets: widgets['colors_slider'].configure(state=param_state)
+         if 'reuse_checkbox' in widgets: widgets['reuse_checkbox'].configure(state=param_state)
+         if 'size_slider' in widgets: widgets['size_slider'].configure(state=param_state)
+         if 'resample_menu' in widgets: widgets['resample_menu'].configure(state=param_state)
+         if 'max_size_menu' in widgets: widgets['max_size_menu'].configure(state=param_state)
+         if 'psnr_slider' in widgets: widgets['psnr_slider'].configure(state=param_state)
+         if 'ssim_slider' in widgets: widgets['ssim_slider'].configure(state=param_state)
+         if 'margin_slider' in widgets: widgets['margin_slider'].configure(state=param_state)
+         if 'tolerance_slider' in widgets: widgets['tolerance_slider'].configure(state=param_state)
+         for size_cb in widgets.get('size_checkboxes', ()): size_cb.configure(state=param_state)
+         for format_cb in widgets.get('format_checkboxes', ()): format_cb.configure(state=param_state)
+
+    def toggle_settings_visibility(self, key, show=None):
+        """Toggles the visibility of the parameter sub-frame for a compression option."""
+        widgets = self.compression_widgets.get(key)
+        if not widgets or 'param_frame' not in widgets: return
+
+        param_frame = widgets['param_frame']
+        is_currently_visible = widgets.get('param_visible', False)
+        should_show = not is_currently_visible if show is None else show
+
+        if should_show:
+            param_frame.grid(row=1, column=0, sticky="ew", padx=10, pady=(0, 5))
+            widgets['settings_button'].configure(text="▲ Settings")
+            widgets['param_visible'] = True
+        else:
+            param_frame.grid_remove()
+            widgets['settings_button'].configure(text="▼ Settings")
+            widgets['param_visible'] = False
+
+    def select_files(self):
+        filetypes = [("Image Files", "*.png *.jpg *.jpeg *.gif *.bmp *.tiff *.webp"), ("All Files", "*.*")]
+        files = tkinter.filedialog.askopenfilenames(title="Select Image Files", filetypes=filetypes)
+        if files:
+            self.input_files = list(files)
+            self.input_folder = ""
+            num_files = len(self.input_files)
+            self.input_label.configure(text=f"{num_files} file{'s' if num_files != 1 else ''} selected.", text_color="white")
+            self._add_status(f"Selected {num_files} image file{'s' if num_files != 1 else ''}.")
+        else:
+            self.input_files = []
+            self.input_folder = ""
+            self.input_label.configure(text="No files selected.", text_color="gray")
+            self._add_status("File selection cancelled.")
+        self.check_conversion_ready()
+
+    def select_input_folder(self):
+        folder = tkinter.filedialog.askdirectory(title="Select Input Folder")
+        if folder:
+            # Not listed here: the worker scans the tree while it converts
+            self.input_folder = folder
+            self.input_files = []
+            self.input_label.configure(text=f"{folder} (and subfolders)", text_color="white")
+            self._add_status(f"Input folder set to: {folder} (subfolders are mirrored in the output)")
+        else:
+            self._add_status("Folder selection cancelled.")
+        self.check_conversion_ready()
+
+    def select_output_folder(self):
+        folder = tkinter.filedialog.askdirectory(title="Select Output Folder")
+        if folder:
+            self.output_folder = folder
+            self.output_label.configure(text=folder, text_color="white")
+            self._add_status(f"Output folder set to: {folder}")
+        else:
+            self._add_status("Output folder selection cancelled.")
+        self.check_conversion_ready()
+
+    def check_conversion_ready(self):
+        if (self.input_files or self.input_folder) and self.output_folder:
+            self.convert_button.configure(state="normal")
+        else:
+            self.convert_button.configure(state="disabled")
+
+    def start_conversion(self):
+        if not (self.input_files or self.input_folder) or not self.output_folder:
+            self._add_status("Error: Please select input files and an output folder first.", error=True); return
+        if self.processing_thread and self.processing_thread.is_alive():
+             self._add_status("Warning: Processing is already running.", error=True); return
+
+        self._set_controls_enabled(False)
+        self.progress_bar.set(0)
+        self._clear_status()
+        self._add_status("Starting conversion...")
+        if self.compression_settings["enabled"]:
+             self._add_status("Compression options are ENABLED.")
+             for key, settings in self.compression_settings.items():
+                 if key != "enabled" and isinstance(settings, dict) and settings.get("enabled"):
+                      params = ", ".join(f"{p}={v}" for p, v in settings.items() if p != "enabled")
+                      self._add_status(f"  - Applying: {key.replace('_',' ').title()}" + (f" ({params})" if params else ""))
+        else: self._add_status("Compression options are disabled.")
+        mode = self.batch_settings["mode"]
+        workers = 1 if mode == "serial" else self.batch_settings["workers"]
+        self._add_status(f"Engine: {EXECUTOR_MODE_LABELS[mode]} ({workers} worker{'s' if workers != 1 else ''})")
+        if self.batch_settings["incremental"]: self._add_status("Skipping files that are already up to date.")
+        if self.batch_settings["low_memory"]: self._add_status(f"Low memory mode: band-wise PNG encoding, {LOW_MEMORY_BUDGET_MB} MB job budget.")
+
+        self.stop_processing_flag = False
+        self.channel.reset()
+        current_compression_settings = copy.deepcopy(self.compression_settings)
+        current_batch_settings = dict(self.batch_settings, workers=workers)
+
+        self.processing_thread = threading.Thread(
+            target=self._conversion_worker,
+            args=(self.input_folder or list(self.input_files), self.output_folder, self.channel, current_compression_settings,
+                  current_batch_settings, lambda: self.stop_processing_flag),
+            daemon=True
+        )
+        self.processing_thread.start()
+
+    def _set_controls_enabled(self, enabled: bool):
+        """Enable or disable main control widgets."""
+        state = "normal" if enabled else "disabled"
+        self.select_files_button.configure(state=state)
+        self.select_folder_button.configure(state=state)
+        self.select_output_button.configure(state=state)
+        self.compression_toggle_checkbox.configure(state=state)
+        self.engine_menu.configure(state=state)
+        self.workers_slider.configure(state=state if self.batch_settings["mode"] != "serial" else "disabled")
+        self.incremental_checkbox.configure(state=state)
+        self.low_memory_checkbox.configure(state=state)
+        self.instrument_checkbox.configure(state=state)
+        self.dedup_checkbox.configure(state=state)
+        self.resume_checkbox.configure(state=state)
+
+        # Mute button state depends on music loaded status as well
+        if self.music_loaded:
+            self.mute_button.configure(state=state)
+        else:
+            self.mute_button.configure(state="disabled") # Always disabled if no music
+
+        # Compression options
+        for key, widgets in self.compression_widgets.items():
+             master_widget_state = "disabled"
+             if enabled:
+                 option_enabled = self.compression_settings.get(key, {}).get("enabled", False)
+                 master_widget_state = "normal"
+                 param_widget_state = "normal" if option_enabled else "disabled"
+             else: param_widget_state = "disabled"
+
+             if 'checkbox' in widgets: widgets['checkbox'].configure(state=master_widget_state)
+             if 'settings_button' in widgets: widgets['settings_button'].configure(state=param_widget_state)
+             if 'quality_slider' in widgets: widgets['quality_slider'].configure(state=param_widget_state)
+             if 'colors_slider' in widgets: widgets['colors_slider'].configure(state=param_widget_state)
+             if 'reuse_checkbox' in widgets: widgets['reuse_checkbox'].configure(state=param_widget_state)
+             if 'size_slider' in widgets: widgets['size_slider'].configure(state=param_widget_state)
+             if 'resample_menu' in widgets: widgets['resample_menu'].configure(state=param_widget_state)
+             if 'max_size_menu' in widgets: widgets['max_size_menu'].configure(state=param_widget_state)
+             if 'psnr_slider' in widgets: widgets['psnr_slider'].configure(state=param_widget_state)
+             if 'ssim_slider' in widgets: widgets['ssim_slider'].configure(state=param_widget_state)
+             if 'margin_slider' in widgets: widgets['margin_slider'].configure(state=param_widget_state)
+             if 'tolerance_slider' in widgets: widgets['tolerance_slider'].configure(state=param_widget_state)
+             for size_cb in widgets.get('size_checkboxes', ()): size_cb.configure(state=param_widget_state)
+             for format_cb in widgets.get('format_checkboxes', ()): format_cb.configure(state=param_widget_state)
+
+        # Convert button
+        self.convert_button.configure(state="disabled")
+        if enabled: self.check_conversion_ready()
+
+    def _add_status(self, message: str, error: bool = False):
+        self._add_status_lines([(message, error)])
+
+    def _add_status_lines(self, lines):
+        """Appends lines in one textbox update and trims the box to the last STATUS_LOG_LINES lines."""
+        if not lines: return
+        text = "".join(f"{'ERROR: ' if error else ''}{message}\n" for message, error in lines)
+        self.status_textbox.configure(state="normal")
+        self.status_textbox.insert("end", text)
+        line_count = int(self.status_textbox.index("end-1c").split(".")[0])
+        if line_count > STATUS_LOG_LINES:
+            self.status_textbox.delete("1.0", f"{line_count - STATUS_LOG_LINES}.0")
+        self.status_textbox.configure(state="disabled")
+        self.status_textbox.see("end")
+
+    def _update_progress(self, value: float):
+        self.progress_bar.set(value)
+
+    def _clear_status(self):
+        self.status_textbox.configure(state="normal")
+        self.status_textbox.delete("1.0", "end")
+        self.status_textbox.configure(state="disabled")
+
+    def process_queue(self):
+        """Every 100 ms: one textbox update and at most one progress update, however many files finished."""
+        try:
+            update = self.channel.drain()
+            lines = update["lines"]
+            if update["dropped"]:
+                lines.insert(0, (f"... {update['dropped']} earlier messages skipped ...", False))
+            if update["done"]:
+                if update["stage_totals"]:
+                    lines.append(("Stage totals: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in update["stage_totals"].items()), False))
+                lines.append(("Conversion finished.", False))
+            self._add_status_lines(lines)
+            if update["progress"] is not None: self._update_progress(update["progress"])
+            if update["done"]: self._set_controls_enabled(True)
+        finally: self.after(100, self.process_queue)
+
+    # EXIT
+    def on_closing(self):
+        """Handles the event when the user clicks the close button."""
+        if self.exit_splash: # Prevent opening multiple splashes
+            return
+
+        # Tell a running batch to stop handing out new files
+        self.stop_processing_flag = True
+
+        # Stop music if playing
+        if self.music_loaded and pygame.mixer.get_init():
+            pygame.mixer.music.stop()
+
+        # Hide the main window immediately
+        self.withdraw()
+
+        # Create the splash screen
+        self.exit_splash = ctk.CTkToplevel(self)
+        self.exit_splash.overrideredirect(True) # Remove window decorations
+        self.exit_splash.attributes("-topmost", True) # Keep it on top
+
+        splash_width = 350
+        splash_height = 120
+
+        # Calculate center position add center to monitor so it looks nice
+        screen_width = self.winfo_screenwidth()
+        screen_height = self.winfo_screenheight()
+        x_pos = (screen_width // 2) - (splash_width // 2)
+        y_pos = (screen_height // 2) - (splash_height // 2)
+
+        self.exit_splash.geometry(f"{splash_width}x{splash_height}+{x_pos}+{y_pos}")
+
+        # Add content to splash screen
+        # For "glow": Using white text on the default dark background of CTkToplevel
+        # A true glow is complex; this provides high contrast.
+        font_large = ctk.CTkFont(size=18, weight="bold")
+        font_small = ctk.CTkFont(size=10)
+
+        label_main = ctk.CTkLabel(
+            self.exit_splash,
+            text="Created with love, by Bear + Tovia",
+            font=font_large,
+            text_color="#FFFFFF" # Bright white text
+        )
+        label_main.pack(pady=(25, 5), padx=20) # Add padding
+
+        label_sub = ctk.CTkLabel(
+            self.exit_splash,
+            text="now get creating, friend, dont procrastinate.",
+            font=font_small,
+            text_color="#CCCCCC" # Slightly dimmer white/gray
+        )
+        label_sub.pack(pady=(0, 20), padx=20)
+
+        # Schedule the closing of the splash and the app
+        self.exit_splash.after(2500, self.quit_app) # 2.5 seconds
+
+    def quit_app(self):
+        """Destroys the splash screen and the main application."""
+        if self.exit_splash:
+            self.exit_splash.destroy()
+        if pygame_available and pygame.mixer.get_init():
+            pygame.mixer.quit() # Clean up pygame mixer
+        self.destroy() # Destroy the main CTk window and exit mainloop
+
+
+    # workerthread function
+    @staticmethod
+    def _conversion_worker(input_files, output_folder, channel, compression_settings,
+                           batch_settings=None, should_stop=None):
+        batch_settings = batch_settings or {"mode": "serial", "workers": 1}
+        try:
+            manifest = BuildManifest(output_folder, force=not batch_settings.get("incremental", False))
+            streaming = isinstance(input_files, str) # A folder: scanned while the batch runs, planned per file
+            found = [0]
+            if streaming:
+                def scanned(folder):
+                    for item in scan_images(folder, skip=(output_folder,)):
+                        found[0] += 1
+                        yield item
+                input_files, plan = scanned(input_files), None
+            else:
+                plan = plan_batch(input_files, compression_settings, manifest)
+                counts = summarize_plan(plan)
+                channel.status("Plan: " + ", ".join(f"{count} to {action}" for action, count in counts.items()))
+            report = RunReport(os.path.join(output_folder, REPORT_FILENAME)) if batch_settings.get("instrument") else None
+            journal = RunJournal(output_folder, compression_settings, resume=batch_settings.get("resume", False))
+            if journal.entries:
+                channel.status(f"Resuming: {len(journal.entries)} files already finished.")
+            total_files = None if streaming else len(input_files)
+            success_count = 0; error_count = 0; skipped_count = 0; processed = 0
+            dedup_count = 0; dedup_bytes = 0
+            for file_path, output_path, info in run_batch(input_files, output_folder, compression_settings,
+                                                          mode=batch_settings["mode"], workers=batch_settings["workers"],
+                                                          should_stop=should_stop, manifest=manifest, plan=plan,
+                                                          link_identical=batch_settings.get("link_identical", False),
+                                                          low_memory=batch_settings.get("low_memory", False),
+                                                          memory_budget_mb=batch_settings.get("memory_budget_mb", 0),
+                                                          instrument=report is not None,
+                                                          dedup=batch_settings.get("dedup"), journal=journal,
+                                                          lazy_plan=streaming):
+                processed += 1
+                filename = os.path.basename(file_path)
+                if report is not None:
+                    report.add(file_path, output_path, info)
+                    if "timings" in info:
+                        channel.timing(info["timings"])
+                if not output_path:
+                    error_count += 1
+                    # Error message printed in make_image_square, signal failure here
+                    channel.status(f"Failed conversion: {filename}", error=True)
+                elif info.get("skipped"):
+                    skipped_count += 1
+                else:
+                    success_count += 1
+                    if info.get("action") == "dedup":
+                        dedup_count += 1
+                        dedup_bytes += os.path.getsize(file_path)
+                    score = f" ({info['quality']['metric']} {info['quality']['score']})" if info.get("quality") else ""
+                    channel.status(f"Processed ({processed}/{total_files or found[0]}): {filename}{score}",
+                                   error=not info.get("quality", {}).get("passed", True))
+                progress = processed / (total_files or max(found[0], 1)) # While scanning, relative to the files found so far
+                channel.progress(progress)
+            final_message = f"Completed. {success_count} succeeded, {error_count} failed."
+            if skipped_count:
+                final_message += f" {skipped_count} already up to date."
+            if dedup_count:
+                final_message += f" {dedup_count} duplicates reused ({dedup_bytes / (1024 * 1024):.1f} MB not reprocessed)."
+            if total_files is None and should_stop and should_stop():
+                final_message = f"Stopped. {success_count} succeeded, {error_count} failed."
+            elif total_files is not None and processed < total_files:
+                final_message = f"Stopped. {success_count} succeeded, {error_count} failed, {total_files - processed} not started."
+            channel.status(final_message, error=error_count > 0)
+            if report is not None:
+                summary = report.close()
+                if summary["slowest"]:
+                    channel.status(f"Slowest {len(summary['slowest'])} files:")
+                    for entry in summary["slowest"]:
+                        channel.status(f"  {entry['seconds']:.3f}s  {os.path.basename(entry['file'])}")
+                channel.status(f"Run report written to {report.path}")
+        except Exception as e: # e.g. a pool worker killed (BrokenProcessPool) or an unwritable manifest/journal
+            channel.status(f"Conversion stopped by an error: {type(e).__name__}: {e}", error=True)
+        finally:
+            channel.finish() # Always, so the UI re-enables its controls
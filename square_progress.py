@@ -0,0 +1,66 @@
+""" Worker -> UI reporting channel whose UI-side cost does not grow with the number of files. """
+import collections
+import threading
+
+STATUS_LOG_LINES = 500 # Lines kept in the status box (and pending between UI ticks)
+
+
+class ProgressChannel:
+    """Thread-safe mailbox the batch worker writes into and the UI drains on a timer.
+
+    Instead of one queue message per event, the worker's updates are coalesced: progress
+    and stage timings only keep their latest/summed value, and status lines go into a
+    bounded ring buffer (the oldest are dropped, and counted, if the UI falls behind).
+    drain() therefore costs at most STATUS_LOG_LINES lines per tick however fast files finish.
+    """
+
+    def __init__(self, max_lines=STATUS_LOG_LINES):
+        self._lock = threading.Lock()
+        self._lines = collections.deque(maxlen=max_lines)
+        self._dropped = 0
+        self._progress = None
+        self._stage_totals = {}
+        self._done = False
+
+    # Worker side
+    def status(self, message, error=False):
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen: self._dropped += 1
+            self._lines.append((message, error))
+
+    def progress(self, value):
+        with self._lock:
+            self._progress = value
+
+    def timing(self, timings):
+        with self._lock:
+            for stage, seconds in timings.items():
+                self._stage_totals[stage] = self._stage_totals.get(stage, 0.0) + seconds
+
+    def finish(self):
+        with self._lock:
+            self._done = True
+
+    # UI side
+    def drain(self):
+        """Takes everything reported since the last drain.
+
+        Returns a dict: lines [(message, error)], dropped (lines lost to the ring buffer),
+        progress (latest value or None if unchanged), stage_totals (running totals) and done.
+        """
+        with self._lock:
+            update = {"lines": list(self._lines), "dropped": self._dropped, "progress": self._progress,
+                      "stage_totals": dict(self._stage_totals), "done": self._done}
+            self._lines.clear()
+            self._dropped = 0
+            self._progress = None
+            self._done = False
+        return update
+
+    def reset(self):
+        with self._lock:
+            self._lines.clear()
+            self._dropped = 0
+            self._progress = None
+            self._stage_totals = {}
+            self._done = False
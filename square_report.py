@@ -0,0 +1,78 @@
+""" Structured run report: one JSON line per file plus an aggregate summary with stage percentiles. """
+import json
+import os
+
+REPORT_FILENAME = "square_run_report.jsonl"
+SLOWEST_N = 10
+STAGES = ("read", "decode", "compress", "convert", "trim", "paste", "resize", "encode", "optimize", "gate", "write", "copy", "total")
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values: return None
+    rank = max(1, -(-pct * len(sorted_values) // 100)) # ceil(pct/100 * n)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summary_path(report_path):
+    """report.jsonl -> report.summary.json"""
+    return os.path.splitext(report_path)[0] + ".summary.json"
+
+
+class RunReport:
+    """Streams per-file records to a JSONL file and builds the aggregate summary on close().
+
+    Records come from run_batch results; files without info["timings"] are still listed
+    (status/action) but don't count toward the stage percentiles.
+    """
+
+    def __init__(self, path, slowest_n=SLOWEST_N):
+        self.path = path
+        self.slowest_n = slowest_n
+        self.stage_values = {stage: [] for stage in STAGES}
+        self.totals = [] # (total seconds, image_path)
+        self.counts = {"succeeded": 0, "failed": 0, "skipped": 0}
+        self.gate_scores = {} # metric -> [(score, passed)] from the quality gate
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "w", encoding="utf-8")
+
+    def add(self, image_path, output_path, info):
+        timings = info.get("timings") or {}
+        status = "failed" if not output_path else "skipped" if info.get("skipped") else "succeeded"
+        self.counts[status] += 1
+        record = {"file": image_path, "output": output_path, "status": status, "action": info.get("action"),
+                  "timings": {stage: round(value, 6) for stage, value in timings.items()}}
+        if "quality" in info:
+            record["quality"] = info["quality"]
+            self.gate_scores.setdefault(info["quality"]["metric"], []).append((info["quality"]["score"], info["quality"]["passed"]))
+        self._file.write(json.dumps(record) + "\n")
+        for stage, value in timings.items():
+            self.stage_values.setdefault(stage, []).append(value)
+        if "total" in timings:
+            self.totals.append((timings["total"], image_path))
+
+    def slowest(self):
+        """The slowest_n files by total time, slowest first: [(seconds, image_path)]."""
+        return sorted(self.totals, reverse=True)[:self.slowest_n]
+
+    def summary(self):
+        stages = {}
+        for stage, values in self.stage_values.items():
+            if not values: continue
+            values = sorted(values)
+            stages[stage] = {"count": len(values), "sum": round(sum(values), 4),
+                             **{f"p{p}": round(percentile(values, p), 6) for p in PERCENTILES},
+                             "max": round(values[-1], 6)}
+        gate = {metric: {"count": len(scores), "below_min": sum(not passed for _, passed in scores),
+                         "min": min(score for score, _ in scores), "mean": round(sum(score for score, _ in scores) / len(scores), 4)}
+                for metric, scores in self.gate_scores.items()}
+        return {"files": self.counts, "stages": stages, "quality_gate": gate,
+                "slowest": [{"file": path, "seconds": round(seconds, 4)} for seconds, path in self.slowest()]}
+
+    def close(self):
+        """Closes the JSONL file, writes <report>.summary.json and returns the summary."""
+        self._file.close()
+        summary = self.summary()
+        with open(summary_path(self.path), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        return summary
@@ -0,0 +1,51 @@
+""" Streaming folder scanner: walks input trees with os.scandir and yields images as they are found. """
+import fnmatch
+import os
+
+from square_core import IMAGE_EXTENSIONS
+
+
+def _matches(relative_path, patterns):
+    """True if a glob matches the relative path (with / separators) or just the file name."""
+    name = relative_path.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def scan_images(root, recursive=True, include=(), exclude=(), extensions=IMAGE_EXTENSIONS, skip=()):
+    """Yields (image path, folder relative to root) for every image under root, as it is found.
+
+    A generator over os.scandir with an explicit stack of folders, so the first files come
+    out after one directory listing instead of a full tree walk, and only the folders still
+    to visit are held in memory. Each folder's entries are sorted so runs are repeatable.
+    include/exclude are globs (fnmatch) tried against the root-relative path, using "/", and
+    against the file name; with include set, a file must match one of them, and an excluded
+    folder is not entered. Folder symlinks are not followed (no cycles); folders in skip
+    (e.g. an output folder inside root) are pruned.
+    """
+    skip = {os.path.normcase(os.path.abspath(path)) for path in skip}
+    pending = [""]
+    while pending:
+        relative_dir = pending.pop()
+        folder = os.path.join(root, relative_dir) if relative_dir else root
+        try:
+            with os.scandir(folder) as listing:
+                entries = sorted(listing, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Error: Cannot scan folder {folder}: {e}")
+            continue
+        subfolders = []
+        for entry in entries:
+            relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if (recursive and os.path.normcase(os.path.abspath(entry.path)) not in skip
+                            and not (exclude and _matches(relative_path, exclude))):
+                        subfolders.append(relative_path)
+                    continue
+                if not entry.is_file(): continue
+            except OSError:
+                continue
+            if not entry.name.lower().endswith(extensions): continue
+            if include and not _matches(relative_path, include): continue
+            if exclude and _matches(relative_path, exclude): continue
+            yield entry.path, relative_dir.replace("/", os.sep)
+        pending.extend(reversed(subfolders)) # Depth first, in name order
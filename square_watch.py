@@ -0,0 +1,132 @@
+""" Watch-folder mode: square images as they land, on a warm worker pool. """
+import collections
+import concurrent.futures
+import os
+import re
+import time
+
+from PIL import Image
+
+from square_core import IMAGE_EXTENSIONS, CPU_COUNT, plan_image, _square_job
+
+DEFAULT_POLL_INTERVAL = 0.2 # Seconds between folder scans
+DEFAULT_SETTLE_TIME = 0.4 # A file must keep the same size/mtime this long before it is processed
+OUTPUT_NAME = re.compile(r"_square(_\d+)?$") # NAME_square and NAME_square_<size> stems (see _output_path)
+
+
+def _warm_worker():
+    """Pool initializer: load every Pillow format plugin once, so the first real job doesn't pay for it."""
+    Image.init()
+
+
+class FolderWatcher:
+    """Polls a folder and squares new or changed images once they stop changing (debounce).
+
+    A file is picked up after its (size, mtime) has been stable for settle_time, so
+    half-written exports are left alone. Work runs on one long-lived pool (process or
+    thread), with at most two jobs per worker in flight; the rest wait in a backlog.
+    A manifest (square_cache.BuildManifest) skips files already squared by earlier runs.
+    on_result(image_path, output_path, info) is called for every finished file.
+    """
+
+    def __init__(self, watch_folder, output_folder, compression_settings, mode="process", workers=CPU_COUNT,
+                 manifest=None, job_options=None, poll_interval=DEFAULT_POLL_INTERVAL,
+                 settle_time=DEFAULT_SETTLE_TIME, on_result=None):
+        self.watch_folder = watch_folder
+        self.output_folder = output_folder
+        self.compression_settings = compression_settings
+        self.mode = mode
+        self.workers = max(1, int(workers or 1))
+        self.manifest = manifest
+        self.job_options = job_options or {}
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.on_result = on_result or (lambda image_path, output_path, info: None)
+        self.pending = {} # path -> (stat key, time first seen with that key)
+        self.done = {} # path -> stat key it was last processed (or failed) at
+        self.backlog = collections.deque()
+
+    def _scan(self):
+        """{path: (size, mtime_ns)} for the images currently in the watched folder.
+
+        When the output folder is the watched folder, our own _square outputs are left out
+        (they would otherwise be squared again, forever); every other image is still picked up.
+        """
+        found = {}
+        in_place = os.path.normcase(os.path.abspath(self.output_folder)) == os.path.normcase(os.path.abspath(self.watch_folder))
+        try:
+            with os.scandir(self.watch_folder) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file(): continue
+                    if in_place and OUTPUT_NAME.search(os.path.splitext(entry.name)[0]): continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue # Deleted between listing and stat
+                    found[entry.path] = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return found
+
+    def poll(self, now=None):
+        """One scan; returns the paths whose contents have settled since they last changed."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        current = self._scan()
+        for path, key in current.items():
+            if self.done.get(path) == key: continue
+            first_seen = self.pending.get(path)
+            if first_seen is None or first_seen[0] != key:
+                self.pending[path] = (key, now)
+            elif now - first_seen[1] >= self.settle_time:
+                del self.pending[path]
+                ready.append((path, key))
+        for path in list(self.pending):
+            if path not in current: del self.pending[path]
+        return ready
+
+    def _make_executor(self):
+        if self.mode in ("process", "pipeline"): # Watched files arrive one by one; nothing to prefetch
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+            for _ in range(self.workers): executor.submit(_warm_worker) # Spawn workers now, not on the first file
+            return executor
+        return concurrent.futures.ThreadPoolExecutor(max_workers=self.workers if self.mode == "thread" else 1)
+
+    def run(self, should_stop=None):
+        """Watches until should_stop() returns True (or KeyboardInterrupt)."""
+        should_stop = should_stop or (lambda: False)
+        max_in_flight = self.workers * 2
+        in_flight = {} # future -> (path, stat key)
+        os.makedirs(self.output_folder, exist_ok=True)
+        executor = self._make_executor()
+        try:
+            while not should_stop():
+                self.backlog.extend(self.poll())
+                while self.backlog and len(in_flight) < max_in_flight:
+                    path, key = self.backlog.popleft()
+                    entry = plan_image(path, self.compression_settings, self.manifest)
+                    if entry["action"] == "skip":
+                        self.done[path] = key
+                        if entry["output"]: self.on_result(path, entry["output"], {"action": "skip", "skipped": entry["reason"]})
+                        continue
+                    future = executor.submit(_square_job, path, self.output_folder, self.compression_settings,
+                                             entry["action"], self.job_options)
+                    in_flight[future] = (path, key)
+
+                if not in_flight:
+                    if self.manifest is not None: self.manifest.save()
+                    time.sleep(self.poll_interval)
+                    continue
+                finished, _ = concurrent.futures.wait(in_flight, timeout=self.poll_interval,
+                                                      return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    path, key = in_flight.pop(future)
+                    self.done[path] = key # Failed files are retried only after they change again
+                    image_path, output_path, info = future.result()
+                    if output_path and self.manifest is not None:
+                        self.manifest.record(image_path, output_path, self.compression_settings)
+                    self.on_result(image_path, output_path, info)
+        finally:
+            for future in in_flight: future.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+            if self.manifest is not None: self.manifest.save()